@@ -4,6 +4,7 @@ npm run build
 cd ../Backend
 pip install -r requirements.txt
 uvicorn Service:app --host 0.0.0.0 --port 80 &
+python ScraperWorker.py &
 
 cd ../Frontend
 npm run build:watch
\ No newline at end of file
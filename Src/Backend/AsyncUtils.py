@@ -0,0 +1,10 @@
+import asyncio
+
+async def gather_all(*coroutines) -> list:
+	"""Like asyncio.gather, but lets every coroutine finish before raising the first error,
+	so nothing is left running against a closed session or database"""
+	results = await asyncio.gather(*coroutines, return_exceptions=True)
+	errors = [result for result in results if isinstance(result, BaseException)]
+	if errors:
+		raise Exception(f"{len(errors)} of {len(results)} tasks failed, first error: {errors[0]}") from errors[0]
+	return results
@@ -0,0 +1,105 @@
+import asyncio
+from Database import Database, GameCountryData
+from Game import Game
+from Price import Price
+from ScrapeJob import ScrapeJob
+from Log import get_logger
+
+log = get_logger("BatchWriter")
+
+class BatchWriter:
+	"""Buffers scraped data and writes it with one transaction per flush instead of one per game.
+	Flushes when flush_size games/country data are buffered, every flush_interval seconds and on exit.
+	Job progress is committed in the same transaction as the data, so a resumed job never
+	skips items that weren't saved. A failed write keeps its data buffered for the next flush,
+	and the flush on exit raises if it still can't be written."""
+	def __init__(self, database: Database, flush_size: int = 200, flush_interval: float = 10):
+		self.database = database
+		self.flush_size = flush_size
+		self.flush_interval = flush_interval
+		self.lock = asyncio.Lock()
+		self.flush_task: asyncio.Task = None
+		self._reset()
+
+	def _reset(self):
+		self.games: list[Game] = []
+		self.game_sources: list[tuple] = []
+		self.countries_data: dict[int, GameCountryData] = {}
+		self.price_refreshes: dict[str, dict[int, Price]] = {}
+		self.completed_job_items: list[tuple] = []
+
+	def buffered_count(self) -> int:
+		return len(self.games) + len(self.countries_data)
+
+	async def __aenter__(self):
+		self.flush_task = asyncio.create_task(self._flush_periodically())
+		return self
+
+	async def __aexit__(self, *exc_info):
+		self.flush_task.cancel()
+		await self.flush()
+
+	async def _flush_periodically(self):
+		while True:
+			await asyncio.sleep(self.flush_interval)
+			try:
+				await self.flush()
+			except Exception as e:
+				# Still buffered, tried again with the next flush
+				log.warning("Batched write failed", error=e)
+
+	async def _added(self):
+		if self.buffered_count() >= self.flush_size:
+			await self.flush()
+
+	async def add_game(self, game: Game):
+		self.games.append(game)
+		await self._added()
+
+	async def add_game_sources(self, steam_id: int, fingerprints: dict[str, str]):
+		self.game_sources.extend((steam_id, source, fingerprint) for source, fingerprint in fingerprints.items())
+		await self._added()
+
+	async def add_country_data(self, countries_data: dict[int, GameCountryData]):
+		for steam_id, country_data in countries_data.items():
+			if steam_id in self.countries_data:
+				self.countries_data[steam_id].merge(country_data)
+			else:
+				self.countries_data[steam_id] = country_data
+		await self._added()
+
+	async def add_price_refresh(self, region_code: str, prices: dict[int, Price]):
+		self.price_refreshes.setdefault(region_code, {}).update(prices)
+		await self._added()
+
+	async def complete_job_items(self, job: ScrapeJob, stage: str, items: list[str]):
+		self.completed_job_items.extend((job.id, stage, item) for item in items)
+		await self._added()
+
+	async def flush(self):
+		async with self.lock:
+			if not self.buffered_count() and not self.game_sources and not self.price_refreshes and not self.completed_job_items:
+				return
+			games, game_sources, countries_data, price_refreshes, completed_job_items = self.games, self.game_sources, self.countries_data, self.price_refreshes, self.completed_job_items
+			self._reset()
+			try:
+				await self.database.write_batch(games, game_sources, countries_data, price_refreshes, completed_job_items)
+			except BaseException:
+				# Cancelled too, the transaction is rolled back either way
+				self._restore(games, game_sources, countries_data, price_refreshes, completed_job_items)
+				raise
+
+	def _restore(self, games, game_sources, countries_data, price_refreshes, completed_job_items):
+		"""Puts data that failed to be written back in front of what was added since"""
+		self.games = games + self.games
+		self.game_sources = game_sources + self.game_sources
+		for steam_id, country_data in self.countries_data.items():
+			if steam_id in countries_data:
+				countries_data[steam_id].merge(country_data)
+			else:
+				countries_data[steam_id] = country_data
+		self.countries_data = countries_data
+		for region_code, prices in self.price_refreshes.items():
+			price_refreshes.setdefault(region_code, {}).update(prices)
+		self.price_refreshes = price_refreshes
+		self.completed_job_items = completed_job_items + self.completed_job_items
@@ -0,0 +1,82 @@
+"""Compares parsing Co-Optimus responses the old way (BeautifulSoup tree, kept until all are parsed)
+with CoopParser (lxml, freeing each game as it's read), on the Co-Optimus responses recorded in the response cache.
+Falls back to generated responses when the cache has none.
+
+Run from Src/Backend: python -m Benchmarks.CoopParsing [http_cache.db]"""
+import sqlite3
+import sys
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+from CoopParser import parse_games
+
+def load_recorded(db_path: str) -> list[bytes]:
+	try:
+		with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+			rows = conn.execute("SELECT content FROM Response WHERE key LIKE 'https://api.co-optimus.com/games.php?%'").fetchall()
+	except sqlite3.Error:
+		return []
+	return [row[0] for row in rows]
+
+def generate(responses: int = 300, games: int = 40) -> list[bytes]:
+	def game(i):
+		return (f"<game><id>{i}</id><title>Co-op Game {i} &amp; Friends</title><system>PC</system><steam>{200000 + i}</steam>"
+			f"<local>{i % 4}</local><lan>{i % 8}</lan><online>{i % 16}</online><combo>0</combo>"
+			f"<url>https://www.co-optimus.com/game/{i}/pc/co-op-game-{i}.html</url>"
+			f"<description>{'Some text about the co-op modes. ' * 10}</description></game>")
+	return [f"<?xml version='1.0'?><games>{''.join(game(r * games + i) for i in range(games))}</games>".encode() for r in range(responses)]
+
+def parse_beautifulsoup(responses: list[bytes]) -> list[dict]:
+	"""How Scraper parsed responses before CoopParser"""
+	all_games = []
+	for content in responses:
+		all_games.extend(BeautifulSoup(content, "lxml-xml").find_all("game"))
+	records = []
+	for game in all_games:
+		if not game.find("steam"):
+			continue
+		records.append({
+			"title": game.find("title").text,
+			"steam": game.find("steam").text,
+			"local": int(game.find("local").text or 0),
+			"lan": int(game.find("lan").text or 0),
+			"online": int(game.find("online").text or 0),
+			"url": game.find("url").text,
+		})
+	return records
+
+def parse_lxml(responses: list[bytes]) -> list[dict]:
+	records = []
+	for content in responses:
+		records.extend(record for record in parse_games(content) if record["steam"])
+	return records
+
+def measure(parse, responses: list[bytes], repeat: int = 3) -> tuple[float, int, int]:
+	"""Returns (best seconds, peak bytes allocated, records)"""
+	best = float("inf")
+	for _ in range(repeat):
+		start = time.perf_counter()
+		records = parse(responses)
+		best = min(best, time.perf_counter() - start)
+
+	tracemalloc.start()
+	parse(responses)
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return best, peak, len(records)
+
+def main():
+	db_path = sys.argv[1] if len(sys.argv) > 1 else "http_cache.db"
+	responses = load_recorded(db_path)
+	source = f"{len(responses)} recorded responses from {db_path}"
+	if not responses:
+		responses = generate()
+		source = f"{len(responses)} generated responses (no recorded ones in {db_path})"
+	print(f"{source}, {sum(map(len, responses)) / 1024 / 1024:.1f} MB")
+
+	for name, parse in (("BeautifulSoup", parse_beautifulsoup), ("CoopParser", parse_lxml)):
+		seconds, peak, records = measure(parse, responses)
+		print(f"{name:<14} {seconds * 1000:8.1f} ms {peak / 1024 / 1024:8.1f} MB peak {records:7d} games")
+
+if __name__ == "__main__":
+	main()
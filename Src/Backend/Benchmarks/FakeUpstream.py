@@ -0,0 +1,165 @@
+"""Stand-in for Co-Optimus, the Steam store and SteamSpy, to scrape against without a network.
+Plug it into the scraper's HttpClient as its transport. Requests are answered from recorded responses
+(a response cache database from a real scrape) where there's one, otherwise from a generated catalogue
+of games that's the same for every run with the same seed. Latency, server errors, throttling and
+per host rate limits can be set to see how the scraper copes with them."""
+import asyncio
+import json
+import random
+import sqlite3
+import time
+from collections import deque
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
+from HttpClient import HttpResponse
+from ResponseCache import ResponseCache
+from Benchmarks.SyntheticData import load_countries, local_price
+
+def load_recorded(db_path: str) -> dict[str, bytes]:
+	"""Successful responses in a response cache database, by cache key"""
+	try:
+		with sqlite3.connect(f"file:{db_path}?mode=ro", uri=True) as conn:
+			rows = conn.execute("SELECT key, content FROM Response WHERE status = 200").fetchall()
+	except sqlite3.Error:
+		return {}
+	return dict(rows)
+
+class FakeGame:
+	def __init__(self, steam_id: int, seed: int):
+		rng = random.Random(steam_id * 7919 + seed)
+		self.steam_id = steam_id
+		self.title = f"Fake Co-op Game {steam_id}"
+		self.release_date = date.today() - timedelta(days=int(min(rng.expovariate(1 / 6), 36) * 365) - 60)
+		self.local = rng.choice([0, 0, 0, 2, 4])
+		self.lan = rng.choice([0, 0, 0, 0, 8])
+		self.online = rng.choice([0, 2, 4, 4, 8, 16])
+		self.removed = rng.random() < 0.02
+		self.free = rng.random() < 0.05
+		self.usd_price = rng.choice([499, 999, 1499, 1999, 2999, 3999])
+		self.discount = rng.choice([0.25, 0.5, 0.75]) if rng.random() < 0.12 else 0
+		self.reviews = int(rng.expovariate(1 / 2000))
+		self.positive = int(self.reviews * rng.uniform(0.4, 1))
+		self.tags = rng.sample(["Co-op", "Online Co-Op", "Local Co-Op", "Action", "Adventure", "Indie", "Puzzle", "Survival", "Shooter", "RPG"], rng.randint(2, 8))
+
+class FakeUpstream:
+	result_cap = 40				# Games per Co-Optimus search, like the real one
+
+	def __init__(self,
+		games: int = 2000,
+		seed: int = 1,
+		latency: float = 0.05,
+		error_rate: float = 0,
+		throttle_rate: float = 0,
+		rate_limits: dict[str, float] = None,
+		recorded: dict[str, bytes] = None):
+		self.random = random.Random(seed)
+		self.latency = latency						# Mean seconds before a response, jittered +-50%
+		self.error_rate = error_rate				# Part of requests answered with a 500
+		self.throttle_rate = throttle_rate			# Part of requests answered with a 429 regardless of rate
+		self.rate_limits = rate_limits or {}		# Host -> requests per second, more within a second get a 429
+		self.recorded = recorded or {}
+		self.cache_key = ResponseCache([]).key
+		self.currencies = dict(load_countries())
+		self.games = { game.steam_id: game for game in (FakeGame(10 + i * 10, seed) for i in range(games)) }
+		self.recent: dict[str, deque] = {}
+		self.requests: dict[str, int] = {}
+		self.distinct: set[str] = set()
+		self.throttled = 0
+		self.errors = 0
+		self.replayed = 0
+
+	def game(self, steam_id: int) -> FakeGame:
+		return self.games.get(steam_id) or FakeGame(steam_id, 0)
+
+	async def send(self, url: str, params: dict, headers: dict) -> HttpResponse:
+		host = urlsplit(url).hostname
+		key = self.cache_key(url, params)
+		self.requests[host] = self.requests.get(host, 0) + 1
+		self.distinct.add(key)
+		await asyncio.sleep(self.latency * self.random.uniform(0.5, 1.5))
+
+		if self.is_over_rate_limit(host) or self.random.random() < self.throttle_rate:
+			self.throttled += 1
+			return HttpResponse(url, 429, { "Retry-After": "1" }, b"")
+		if self.random.random() < self.error_rate:
+			self.errors += 1
+			return HttpResponse(url, 500, {}, b"")
+
+		if key in self.recorded:
+			self.replayed += 1
+			return HttpResponse(url, 200, {}, self.recorded[key])
+		return HttpResponse(url, 200, {}, self.generate(url, params or {}))
+
+	def is_over_rate_limit(self, host: str) -> bool:
+		if host not in self.rate_limits:
+			return False
+		now = time.monotonic()
+		recent = self.recent.setdefault(host, deque())
+		while recent and recent[0] <= now - 1:
+			recent.popleft()
+		if len(recent) >= self.rate_limits[host]:
+			return True
+		recent.append(now)
+		return False
+
+	def generate(self, url: str, params: dict) -> bytes:
+		if url.startswith("https://api.co-optimus.com/games.php"):
+			return self.cooptimus_search(params)
+		if url.startswith("https://store.steampowered.com/api/appdetails"):
+			steam_ids = [int(steam_id) for steam_id in str(params["appids"]).split(",")]
+			if params.get("filters") == "price_overview":
+				return json.dumps({ str(steam_id): self.price(steam_id, params["cc"]) for steam_id in steam_ids }).encode()
+			return json.dumps({ str(steam_id): self.app_details(steam_id) for steam_id in steam_ids }).encode()
+		if url.startswith("https://store.steampowered.com/appreviews/"):
+			game = self.game(int(url.rsplit("/", 1)[1]))
+			return json.dumps({ "success": 1, "query_summary": { "total_reviews": game.reviews, "total_positive": game.positive } }).encode()
+		if url.startswith("https://steamspy.com/api.php"):
+			game = self.game(int(params["appid"]))
+			return json.dumps({ "appid": game.steam_id, "tags": { tag: 100 - i for i, tag in enumerate(game.tags) } }).encode()
+		raise Exception(f"No fake for {url}")
+
+	def cooptimus_search(self, params: dict) -> bytes:
+		matching = [game for game in self.games.values()
+			if game.release_date.year == int(params["releaseyear"])
+			and ("releasemonth" not in params or game.release_date.month == int(params["releasemonth"]))
+			and ("releaseday" not in params or game.release_date.day == int(params["releaseday"]))]
+		entries = "".join(
+			f"<game><id>{game.steam_id}</id><title>{escape(game.title)}</title><system>PC</system><steam>{game.steam_id}</steam>"
+			f"<local>{game.local}</local><lan>{game.lan}</lan><online>{game.online}</online>"
+			f"<url>https://www.co-optimus.com/game/{game.steam_id}/pc/fake.html</url></game>"
+			for game in matching[:self.result_cap])
+		return f"<?xml version='1.0'?><games>{entries}</games>".encode()
+
+	def app_details(self, steam_id: int) -> dict:
+		game = self.game(steam_id)
+		if game.removed:
+			return { "success": False }
+		coming_soon = game.release_date > date.today()
+		return { "success": True, "data": {
+			"name": game.title,
+			"header_image": f"https://shared.akamai.steamstatic.com/store_item_assets/steam/apps/{steam_id}/header.jpg",
+			"short_description": "A fake game to scrape.",
+			"release_date": { "coming_soon": coming_soon, "date": "" if coming_soon else game.release_date.strftime("%d %b, %Y") },
+		}}
+
+	def price(self, steam_id: int, country_code: str) -> dict:
+		game = self.game(steam_id)
+		if game.removed:
+			return { "success": False }
+		if game.free:
+			return { "success": True, "data": [] }
+		currency = self.currencies.get(country_code, "USD")
+		initial = local_price(game.usd_price, currency)
+		return { "success": True, "data": { "price_overview": { "currency": currency, "initial": initial, "final": int(initial * (1 - game.discount)) } } }
+
+	def get_stats(self) -> dict:
+		requests = sum(self.requests.values())
+		return {
+			"requests": requests,
+			"by_host": dict(self.requests),
+			"retries": requests - len(self.distinct),
+			"throttled": self.throttled,
+			"errors": self.errors,
+			"replayed": self.replayed,
+		}
@@ -0,0 +1,149 @@
+"""Replays a mix of /games searches against the FastAPI app in this process (no network or server in between)
+and reports latency percentiles and throughput per kind of search. Run it on databases from
+Benchmarks.SyntheticData to compare index, cache and search engine changes at different sizes.
+
+Run from Src/Backend: python -m Benchmarks.GamesLoad Benchmarks/Data/games-1x.db [--search sql] [--no-cache]"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from urllib.parse import urlencode
+import httpx
+from Benchmarks.SyntheticData import load_countries
+
+def encode_excluded(steam_ids: list[int]) -> str:
+	"""Same encoding as the frontend uses, see Service.parse_excluded_games"""
+	previous = 0
+	deltas = []
+	for steam_id in sorted(set(steam_ids)):
+		delta = steam_id - previous
+		digits = ""
+		while True:
+			delta, digit = divmod(delta, 36)
+			digits = "0123456789abcdefghijklmnopqrstuvwxyz"[digit] + digits
+			if delta == 0:
+				break
+		deltas.append(digits)
+		previous = steam_id
+	return ".".join(deltas)
+
+class SearchShapes:
+	"""Query strings for each kind of search, varied so most of them aren't answered from the query cache
+	(except "repeated", which is the same search over and over)"""
+	def __init__(self, country_codes: list[str], seed: int):
+		self.country_codes = country_codes
+		self.random = random.Random(seed)
+
+	def query(self, shape: str) -> str:
+		params = { "country_code": self.random.choice(self.country_codes) }
+		params.update(getattr(self, shape.replace("-", "_"))())
+		return "/games?" + urlencode(params)
+
+	def default(self) -> dict:
+		return {}
+
+	def repeated(self) -> dict:
+		return { "country_code": "SE" }
+
+	def couch(self) -> dict:
+		players = self.random.randint(2, 4)
+		return { "player_type": "couch", "min_supported_players": players, "max_supported_players": players }
+
+	def lan_large_groups(self) -> dict:
+		return { "player_type": "lan", "min_supported_players": self.random.choice([8, 16]), "max_supported_players": 100 }
+
+	def paid_and_reviewed(self) -> dict:
+		return { "free_games": "false", "unreleased_games": "false", "min_reviews": self.random.choice([100, 1000, 10000]) }
+
+	def tags(self) -> dict:
+		return { "tags": "|".join(self.random.sample(["Roguelike", "Local Co-Op", "Survival", "Puzzle", "Shooter", "Crafting", "Horror"], self.random.randint(1, 3))) }
+
+	def release_window(self) -> dict:
+		start = date.today() - timedelta(days=self.random.randint(365, 20 * 365))
+		return { "release_date_from": start.strftime("%Y-%m-%d"), "release_date_to": (start + timedelta(days=3 * 365)).strftime("%Y-%m-%d") }
+
+	def weights(self) -> dict:
+		return {
+			"rating_weight": round(self.random.random(), 2),
+			"price_weight": round(self.random.random(), 2),
+			"sale_weight": round(self.random.random(), 2),
+			"number_of_reviews_weight": round(self.random.random(), 2),
+			"high_price": self.random.choice([10, 20, 40]),
+		}
+
+	def deep_page(self) -> dict:
+		return { "next_index": self.random.randrange(100, 1000, 10) }
+
+	def hidden_games(self) -> dict:
+		return { "exclude": encode_excluded([10 + 10 * self.random.randrange(4000) for _ in range(200)]) }
+
+shapes = ["default", "repeated", "couch", "lan-large-groups", "paid-and-reviewed", "tags", "release-window", "weights", "deep-page", "hidden-games"]
+
+async def replay(client: httpx.AsyncClient, queries: list[str], concurrency: int) -> tuple[list[float], float]:
+	"""Returns (seconds per request, seconds for all of them)"""
+	latencies = []
+	pending = iter(queries)
+
+	async def worker():
+		for query in pending:
+			start = time.perf_counter()
+			response = await client.get(query)
+			latencies.append(time.perf_counter() - start)
+			if response.status_code != 200:
+				raise Exception(f"{query} returned {response.status_code}: {response.text}")
+
+	start = time.perf_counter()
+	await asyncio.gather(*[worker() for _ in range(concurrency)])
+	return latencies, time.perf_counter() - start
+
+def percentiles(latencies: list[float]) -> tuple[float, float, float]:
+	cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+	return cuts[49], cuts[94], cuts[98]
+
+async def run(args):
+	# Service opens the database it's pointed to when it's imported
+	os.environ["DATABASE_PATH"] = args.database
+	import Service
+	from QueryCache import QueryCache
+	if args.search == "sql":
+		Service.search_engine = None
+	if args.no_cache:
+		Service.query_cache = QueryCache(max_entries=0)
+
+	country_codes = [code for code, _ in load_countries()]
+	search = SearchShapes(country_codes, args.seed)
+	transport = httpx.ASGITransport(app=Service.app)
+	async with Service.lifespan(Service.app), httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+		# First searches load the search engine and each country's prices, that's measured on its own
+		warmup, warmup_seconds = await replay(client, [f"/games?country_code={code}" for code in country_codes], 1)
+		Service.query_cache.clear()
+		print(f"{args.database}, {args.search} search{', no query cache' if args.no_cache else ''}, concurrency {args.concurrency}")
+		print(f"Warmup: {len(warmup)} countries in {warmup_seconds:.2f} s, first request {warmup[0] * 1000:.1f} ms")
+		print(f"{'search':<18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+
+		all_latencies = []
+		total_seconds = 0
+		for shape in args.shapes:
+			latencies, seconds = await replay(client, [search.query(shape) for _ in range(args.requests)], args.concurrency)
+			all_latencies.extend(latencies)
+			total_seconds += seconds
+			print(f"{shape:<18} " + " ".join(f"{value * 1000:8.2f}" for value in percentiles(latencies)) + f" {len(latencies) / seconds:8.0f}")
+		print(f"{'all':<18} " + " ".join(f"{value * 1000:8.2f}" for value in percentiles(all_latencies)) + f" {len(all_latencies) / total_seconds:8.0f}")
+		print(f"Query cache: {Service.query_cache.get_stats()}")
+
+def main():
+	parser = argparse.ArgumentParser(description="Measures /games latency and throughput per kind of search")
+	parser.add_argument("database", help="Games database, e.g. from Benchmarks.SyntheticData")
+	parser.add_argument("--search", choices=["engine", "sql"], default="engine", help="Answer from the in-memory search engine or SQLite")
+	parser.add_argument("--no-cache", action="store_true", help="Turn off the query cache")
+	parser.add_argument("--requests", type=int, default=200, help="Requests per kind of search")
+	parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight at once")
+	parser.add_argument("--shapes", nargs="+", choices=shapes, default=shapes, help="Kinds of search to run")
+	parser.add_argument("--seed", type=int, default=1)
+	asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+	main()
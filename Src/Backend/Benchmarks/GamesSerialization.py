@@ -0,0 +1,62 @@
+"""Compares the CPU time of turning /games search rows into a response body the old way
+(Game object per row, to_dict, FastAPI's jsonable_encoder and json.dumps) with building the
+response dicts straight from the rows and dumping them with orjson.
+
+Run from Src/Backend: python -m Benchmarks.GamesSerialization"""
+import json
+import sqlite3
+import time
+from fastapi.encoders import jsonable_encoder
+from Database import Database
+from Game import game_response
+import orjson
+
+columns = ("title TEXT, steam_id INTEGER, steam_rating REAL, number_of_reviews INTEGER, couch_players INTEGER, lan_players INTEGER, "
+	"online_players INTEGER, cooptimus_url TEXT, steam_url TEXT, header_image TEXT, short_description TEXT, is_released INTEGER, "
+	"release_date TEXT, release_date_text TEXT, tags TEXT, initial_price INTEGER, final_price INTEGER, calculated_score REAL")
+
+def generate_rows(count: int) -> list[sqlite3.Row]:
+	"""Rows shaped like the ones the /games query returns"""
+	conn = sqlite3.connect(":memory:")
+	conn.row_factory = sqlite3.Row
+	conn.execute(f"CREATE TABLE Search ({columns})")
+	tags = json.dumps(["Co-op", "Online Co-Op", "Action", "Adventure", "Multiplayer", "Indie", "Puzzle", "Local Co-Op"])
+	conn.executemany("INSERT INTO Search VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+		(f"Co-op Game {i}", 200000 + i, 0.5 + (i % 50) / 100, i * 37 % 100000, i % 4, i % 8, i % 16,
+			f"https://www.co-optimus.com/game/{i}/pc/co-op-game-{i}.html", f"https://store.steampowered.com/app/{200000 + i}",
+			f"https://cdn.steam.example/apps/{200000 + i}/header.jpg", "Some text about the game and its co-op modes. " * 4,
+			i % 10 != 0, "2021-03-14", "14 Mar, 2021", tags, 1999 if i % 3 else None, 999 if i % 3 else None, 1 / (i + 1))
+		for i in range(count)])
+	rows = conn.execute("SELECT * FROM Search").fetchall()
+	conn.close()
+	return rows
+
+def serialize_objects(database: Database, rows: list[sqlite3.Row]) -> bytes:
+	"""How /games serialized results before game_response"""
+	games = [database._row_to_game(row).to_dict() for row in rows]
+	return json.dumps(jsonable_encoder({ "games": games, "total_count": len(rows) })).encode()
+
+def serialize_rows(database: Database, rows: list[sqlite3.Row]) -> bytes:
+	return orjson.dumps({ "games": [game_response(row) for row in rows], "total_count": len(rows) })
+
+def measure(serialize, database: Database, rows: list[sqlite3.Row], requests: int) -> float:
+	"""Returns CPU microseconds per request"""
+	start = time.process_time()
+	for _ in range(requests):
+		serialize(database, rows)
+	return (time.process_time() - start) / requests * 1_000_000
+
+def main():
+	database = Database(":memory:")
+	for page_size in (10, 100):
+		rows = generate_rows(page_size)
+		assert orjson.loads(serialize_objects(database, rows)) == orjson.loads(serialize_rows(database, rows))
+		requests = 200_000 // page_size
+		results = [(name, measure(serialize, database, rows, requests)) for name, serialize in
+			(("Game objects + jsonable_encoder", serialize_objects), ("game_response + orjson", serialize_rows))]
+		baseline = results[0][1]
+		for name, microseconds in results:
+			print(f"{page_size:4d} games  {name:<32} {microseconds:9.1f} µs/request  {baseline / microseconds:5.1f}x")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,115 @@
+"""Runs a full scrape job end to end (discovery, games, prices, search table) against FakeUpstream
+and reports wall time per stage, requests per second, retries and time spent writing to the database.
+Everything runs on a fresh database and response cache in a temporary directory, no network needed.
+
+The scraper's rate limits and retry backoff are sped up by --speedup, so the benchmark measures the
+scraper rather than the politeness delays. Use --rate-limit to have the fake throttle a host instead.
+
+Run from Src/Backend: python -m Benchmarks.Scraping [--games 2000] [--latency 0.05] [--errors 0.01] [--recorded http_cache.db]"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from Database import Database
+from RateLimiter import HostLimits
+from ScrapeJob import ScrapeJob
+from ScraperWorker import ScraperWorker
+from Log import set_level
+from Benchmarks.FakeUpstream import FakeUpstream, load_recorded
+
+def timed(method, totals: dict, name: str):
+	"""Wraps an async method to add up the seconds spent in it"""
+	async def wrapper(*args, **kwargs):
+		start = time.perf_counter()
+		try:
+			return await method(*args, **kwargs)
+		finally:
+			totals[name] = totals.get(name, 0) + time.perf_counter() - start
+	return wrapper
+
+def speed_up(worker: ScraperWorker, factor: float):
+	scraper = worker.scraper
+	rate_limiter = scraper.http.rate_limiter
+	rate_limiter.host_limits = { host: HostLimits(limits.concurrency, limits.rate * factor, limits.max_rate * factor, limits.burst)
+		for host, limits in rate_limiter.host_limits.items() }
+	scraper.retry_base_delay /= factor
+	scraper.retry_max_delay /= factor
+	worker.poll_seconds = 0.1
+
+async def scrape(directory: str, upstream: FakeUpstream, speedup: float) -> tuple[dict, dict, list[str], int]:
+	"""Returns (seconds per stage, seconds per database write kind, errors, games in the database)"""
+	database = Database(os.path.join(directory, "games.db"))
+	await database.init_database()
+	write_seconds = {}
+	database.write_batch = timed(database.write_batch, write_seconds, "batched writes")
+	database.rebuild_search_table = timed(database.rebuild_search_table, write_seconds, "search table")
+
+	worker = ScraperWorker(database)
+	worker.scraper.http.cache.db_path = os.path.join(directory, "http_cache.db")
+	worker.scraper.http.transport = upstream.send
+	speed_up(worker, speedup)
+
+	job = await ScrapeJob.start_or_resume(database, True, worker.worker_id)
+	stage_seconds = {}
+	errors = []
+	try:
+		for stage, _, seed, work in worker.scraper.get_stages():
+			start = time.perf_counter()
+			try:
+				failed_items = await worker.run_stage(job, stage, seed, work)
+				if failed_items:
+					errors.append(f"{stage}: {failed_items} items failed every attempt")
+			except Exception as e:
+				errors.append(f"{stage}: {e}")
+			stage_seconds[stage] = time.perf_counter() - start
+		await job.finish("\n".join(errors) if errors else None)
+		games = await database.get_total_games_count()
+	finally:
+		await database.close()
+	return stage_seconds, write_seconds, errors, games
+
+def parse_rate_limits(values: list[str]) -> dict[str, float]:
+	limits = {}
+	for value in values or []:
+		host, rate = value.split("=")
+		limits[host] = float(rate)
+	return limits
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks a full scrape against a fake Co-Optimus, Steam and SteamSpy")
+	parser.add_argument("--games", type=int, default=2000, help="Games in the fake Co-Optimus catalogue")
+	parser.add_argument("--latency", type=float, default=0.05, help="Mean seconds the fake takes to respond")
+	parser.add_argument("--errors", type=float, default=0, help="Part of requests the fake answers with a 500")
+	parser.add_argument("--throttle", type=float, default=0, help="Part of requests the fake answers with a 429")
+	parser.add_argument("--rate-limit", nargs="*", metavar="HOST=RATE", help="Requests per second a host allows before answering 429")
+	parser.add_argument("--recorded", help="Response cache database (e.g. http_cache.db) to replay recorded responses from")
+	parser.add_argument("--speedup", type=float, default=50, help="Factor the scraper's rate limits and retry delays are sped up by")
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--verbose", action="store_true", help="Show the scraper's log, not only errors")
+	args = parser.parse_args()
+
+	upstream = FakeUpstream(args.games, args.seed, args.latency, args.errors, args.throttle,
+		parse_rate_limits(args.rate_limit), load_recorded(args.recorded) if args.recorded else None)
+	with tempfile.TemporaryDirectory() as directory:
+		if not args.verbose:
+			set_level("ERROR")
+		start = time.perf_counter()
+		stage_seconds, write_seconds, errors, games = asyncio.run(scrape(directory, upstream, args.speedup))
+		wall_seconds = time.perf_counter() - start
+
+	stats = upstream.get_stats()
+	print(f"Scraped {games} games in {wall_seconds:.1f} s ({args.games} in the catalogue, {args.latency * 1000:.0f} ms latency, speedup {args.speedup:g})")
+	for stage, seconds in stage_seconds.items():
+		print(f"  {stage:<16} {seconds:8.2f} s")
+	print(f"Requests: {stats['requests']} ({stats['requests'] / wall_seconds:.1f}/s), {stats['retries']} retries, "
+		f"{stats['throttled']} throttled, {stats['errors']} server errors, {stats['replayed']} replayed from recordings")
+	for host, count in stats["by_host"].items():
+		print(f"  {host:<24} {count:6d}")
+	print("Database writes: " + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in write_seconds.items()))
+	if errors:
+		print("Errors:\n" + "\n".join(errors))
+		raise SystemExit(1)
+
+if __name__ == "__main__":
+	main()
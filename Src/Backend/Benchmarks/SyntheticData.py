@@ -0,0 +1,190 @@
+"""Generates games databases shaped like the scraped one, at a multiple of today's size, for benchmarking /games.
+Games get tags, release dates, player counts and reviews spread roughly like Co-Optimus' games do, and a price
+in every country of Countries.json (in the country's currency, some on sale). A few games are delisted in some
+countries and free games have no prices, like the scraper leaves them. GameSearch is built the way the scraper does.
+
+The 100x database has about 100 million price rows and takes a while and several GB of disk to generate.
+
+Run from Src/Backend: python -m Benchmarks.SyntheticData [--scale 1 10 100] [--output-dir Benchmarks/Data]"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sqlite3
+from datetime import date, timedelta
+from Database import Database
+from Game import release_date_format
+from Log import get_logger
+
+log = get_logger("SyntheticData")
+
+base_games = 4000				# About the number of games on Co-Optimus with a Steam ID
+chunk_size = 10_000				# Games written per transaction
+
+tags = [
+	"Co-op", "Online Co-Op", "Local Co-Op", "Multiplayer", "Local Multiplayer", "Split Screen", "Action", "Adventure",
+	"Indie", "Casual", "RPG", "Strategy", "Simulation", "Puzzle", "Platformer", "Shooter", "FPS", "Third Person",
+	"Survival", "Open World", "Sandbox", "Crafting", "Building", "Horror", "Zombies", "Fantasy", "Sci-fi", "Space",
+	"Racing", "Sports", "Fighting", "Beat 'em up", "Party Game", "Funny", "Family Friendly", "Cute", "Pixel Graphics",
+	"2D", "3D", "Roguelike", "Roguelite", "Dungeon Crawler", "Loot", "Hack and Slash", "Tower Defense", "Base Building",
+	"Colony Sim", "Management", "Turn-Based", "Real-Time", "Tactical", "Stealth", "Story Rich", "Atmospheric",
+	"Exploration", "Physics", "Difficult", "Free to Play", "Early Access", "Massively Multiplayer", "PvE", "PvP",
+]
+
+# Rough price of a dollar in the currencies Steam uses, others are priced like dollars
+exchange_rates = {
+	"EUR": 0.9, "GBP": 0.8, "SEK": 10.5, "NOK": 10.5, "DKK": 6.9, "PLN": 4.0, "CHF": 0.9, "JPY": 150, "KRW": 1300,
+	"CNY": 7.2, "INR": 83, "IDR": 15500, "RUB": 90, "UAH": 40, "BRL": 5.0, "MXN": 17, "CAD": 1.35, "AUD": 1.5,
+	"NZD": 1.6, "TRY": 30, "ZAR": 18, "ARS": 850, "CLP": 900, "COP": 3900, "PEN": 3.7, "PHP": 56, "THB": 36,
+	"VND": 24000, "MYR": 4.7, "SGD": 1.35, "HKD": 7.8, "TWD": 31, "SAR": 3.75, "AED": 3.67, "ILS": 3.7, "KZT": 450,
+	"QAR": 3.64, "KWD": 0.31, "CRC": 520, "UYU": 39,
+}
+
+usd_prices = [499, 999, 1499, 1999, 2499, 2999, 3999, 4999, 5999, 6999]
+
+def load_countries() -> list[tuple[str, str]]:
+	with open("../Countries.json", "r") as f:
+		return [(country["code"], country["currency"]) for country in json.load(f)]
+
+def local_price(usd_price: int, currency: str) -> int:
+	"""Price in cents of the currency, ending in 99 like store prices do"""
+	rate = exchange_rates.get(currency, 1)
+	return max(int(round(usd_price * rate, -2)) - 1, 99)
+
+class SyntheticGames:
+	"""Random but reproducible games, prices and delistings"""
+	def __init__(self, countries: list[tuple[str, str]], seed: int):
+		self.countries = countries
+		self.random = random.Random(seed)
+		self.today = date.today()
+
+	def release(self) -> tuple[str, bool]:
+		"""Returns (release date, is released). More games are released every year."""
+		if self.random.random() < 0.03:
+			upcoming = self.today + timedelta(days=self.random.randint(1, 365))
+			return (upcoming if self.random.random() < 0.5 else None), False
+		years_ago = min(self.random.expovariate(1 / 6), 36)
+		return self.today - timedelta(days=int(years_ago * 365) + 1), True
+
+	def players(self, none_chance: float, counts: list[int], weights: list[int]) -> int:
+		if self.random.random() < none_chance:
+			return 0
+		return self.random.choices(counts, weights)[0]
+
+	def game(self, steam_id: int) -> tuple:
+		release_date, is_released = self.release()
+		number_of_reviews = int(math.exp(self.random.gauss(5, 2))) if is_released else 0
+		game_tags = ["Co-op"] + self.random.sample(tags[1:], self.random.randint(4, 19))
+		return (
+			f"Synthetic Co-op Game {steam_id}", steam_id,
+			round(0.4 + 0.6 * self.random.betavariate(5, 2), 4) if number_of_reviews else 0.0, number_of_reviews,
+			release_date.strftime("%Y-%m-%d") if release_date else None,
+			release_date.strftime(release_date_format) if release_date else None,
+			self.players(0.6, [2, 3, 4, 8], [60, 10, 25, 5]),
+			self.players(0.85, [2, 4, 8, 16, 32], [30, 35, 20, 10, 5]),
+			self.players(0.2, [2, 3, 4, 5, 6, 8, 10, 16, 32, 64, 100], [35, 8, 25, 4, 5, 8, 3, 5, 3, 2, 2]),
+			f"https://www.co-optimus.com/game/{steam_id}/pc/synthetic-co-op-game-{steam_id}.html",
+			f"https://store.steampowered.com/app/{steam_id}",
+			f"https://shared.akamai.steamstatic.com/store_item_assets/steam/apps/{steam_id}/header.jpg",
+			"A synthetic game for benchmarking, about as long as the short descriptions on Steam are. " * 2,
+			json.dumps(game_tags), is_released,
+		)
+
+	def country_data(self, steam_id: int, is_free: bool) -> tuple[list[tuple], list[tuple]]:
+		"""Returns the game's (price rows, delisted rows)"""
+		delisted = set()
+		if self.random.random() < 0.04:
+			delisted = { code for code, _ in self.random.sample(self.countries, self.random.randint(1, 30)) }
+		if is_free:
+			return [], [(steam_id, code) for code in delisted]
+
+		usd_price = self.random.choice(usd_prices)
+		discount = self.random.choice([0.1, 0.2, 0.25, 0.33, 0.5, 0.6, 0.75, 0.8, 0.9]) if self.random.random() < 0.12 else 0
+		prices = []
+		for code, currency in self.countries:
+			if code in delisted:
+				continue
+			initial = local_price(usd_price, currency)
+			prices.append((steam_id, code, initial, int(initial * (1 - discount))))
+		return prices, [(steam_id, code) for code in delisted]
+
+async def create_schema(db_path: str):
+	database = Database(db_path)
+	await database.init_database()
+	await database.close()
+
+async def build_search_table(db_path: str, country_codes: list[str]):
+	database = Database(db_path)
+	await database.rebuild_search_table(country_codes)
+	await database.close()
+
+def remove_database(db_path: str):
+	for path in (db_path, f"{db_path}-wal", f"{db_path}-shm"):
+		if os.path.exists(path):
+			os.remove(path)
+
+def generate(db_path: str, scale: float, seed: int = 1):
+	"""Creates a games database with base_games * scale games at db_path, replacing any that's there"""
+	remove_database(db_path)
+	asyncio.run(create_schema(db_path))
+	countries = load_countries()
+	synthetic = SyntheticGames(countries, seed)
+	game_count = int(base_games * scale)
+
+	conn = sqlite3.connect(db_path)
+	conn.execute("PRAGMA journal_mode = WAL")
+	conn.execute("PRAGMA synchronous = OFF")
+	try:
+		for start in range(0, game_count, chunk_size):
+			games, game_tags, prices, delisted = [], [], [], []
+			for i in range(start, min(start + chunk_size, game_count)):
+				steam_id = 10 + i * 10			# Steam IDs are multiples of 10
+				game = synthetic.game(steam_id)
+				games.append(game)
+				game_tags.extend((tag.lower(), steam_id) for tag in json.loads(game[13]))
+				game_prices, game_delisted = synthetic.country_data(steam_id, is_free=synthetic.random.random() < 0.05)
+				prices.extend(game_prices)
+				delisted.extend(game_delisted)
+
+			with conn:
+				conn.executemany("""
+						INSERT INTO Game (
+							title, steam_id, steam_rating, number_of_reviews, release_date, release_date_text,
+							couch_players, lan_players, online_players, cooptimus_url, steam_url,
+							header_image, short_description, tags, is_released
+						) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+					""", games)
+				conn.executemany("INSERT OR IGNORE INTO GameTag (tag, steam_id) VALUES (?, ?)", game_tags)
+				conn.executemany("INSERT INTO GamePrice (steam_id, country_code, initial_price, final_price) VALUES (?, ?, ?, ?)", prices)
+				conn.executemany("INSERT INTO GameDelisted (steam_id, country_code) VALUES (?, ?)", delisted)
+			log.info("Generated games", done=start + len(games), games=game_count)
+	finally:
+		conn.close()
+
+	asyncio.run(build_search_table(db_path, [code for code, _ in countries]))
+	conn = sqlite3.connect(db_path)
+	try:
+		conn.execute("ANALYZE")
+	finally:
+		conn.close()
+
+def database_path(output_dir: str, scale: float) -> str:
+	return os.path.join(output_dir, f"games-{scale:g}x.db")
+
+def main():
+	parser = argparse.ArgumentParser(description="Generates synthetic games databases for benchmarking")
+	parser.add_argument("--scale", type=float, nargs="+", default=[1, 10, 100], help="Sizes to generate, as multiples of today's database")
+	parser.add_argument("--output-dir", default="Benchmarks/Data")
+	parser.add_argument("--seed", type=int, default=1)
+	args = parser.parse_args()
+
+	os.makedirs(args.output_dir, exist_ok=True)
+	for scale in args.scale:
+		db_path = database_path(args.output_dir, scale)
+		log.info("Generating database", path=db_path)
+		generate(db_path, scale, args.seed)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,51 @@
+from typing import Iterator
+from lxml import etree
+from Log import get_logger
+
+log = get_logger("CoopParser")
+
+def parse_games(content: bytes) -> list[dict]:
+	"""Parses a Co-Optimus games.php response into game records.
+	The whole body is parsed at once (responses are at most 40 games and come buffered from the response cache),
+	but no tree of it is kept: each <game> element is freed as soon as its record is made.
+	Entries missing a field are skipped, like malformed XML is."""
+	parser = etree.XMLPullParser(events=("end",), tag="game", recover=True, resolve_entities=False, no_network=True)
+	parser.feed(content)
+	records = list(_read_games(parser))
+	try:
+		parser.close()
+	except etree.XMLSyntaxError as e:
+		# Nothing parseable at all, e.g. an empty response
+		log.warning("Failed to parse games response", error=e)
+	records.extend(_read_games(parser))
+	return records
+
+def _read_games(parser: etree.XMLPullParser) -> Iterator[dict]:
+	for _, element in parser.read_events():
+		record = None
+		try:
+			record = _to_record(element)
+		except Exception as e:
+			log.debug("Failed to parse game entry", error=e)
+
+		# Free the element and any siblings before it, they're done with
+		element.clear()
+		while element.getprevious() is not None:
+			del element.getparent()[0]
+
+		if record is not None:
+			yield record
+
+def _to_record(element) -> dict:
+	fields = { child.tag: child.text for child in element }
+	for required in ("title", "local", "lan", "online", "url"):
+		if required not in fields:
+			raise Exception(f"Missing {required}")
+	return {
+		"title": fields["title"] or "",
+		"steam": fields.get("steam") or None,
+		"local": int(fields["local"] or 0),
+		"lan": int(fields["lan"] or 0),
+		"online": int(fields["online"] or 0),
+		"url": fields["url"] or "",
+	}
@@ -1,12 +1,18 @@
 import asyncio
 import json
+import sqlite3
+import time
 import aiosqlite
+from contextlib import asynccontextmanager
 from Price import Price
 from os import listdir
 from os.path import isfile, join
 from datetime import date, datetime
-from Game import Game
-from dprint import dprint
+from Game import Game, game_response, release_date_format
+from Metrics import database_seconds, games_phase_seconds, job_items_completed, time_methods
+from Log import get_logger
+
+log = get_logger("Database")
 
 class Filters:
     def __init__(self,
@@ -19,7 +25,8 @@ class Filters:
                  from_date: date, 
                  to_date: date,
                  min_reviews: int,
-                 search_tags: list[str]):
+                 search_tags: list[str],
+                 excluded_steam_ids: list[int] = None):
         self.country_code = country_code
         self.min_supported_players = min_supported_players
         self.max_supported_players = max_supported_players
@@ -30,6 +37,7 @@ class Filters:
         self.to_date = to_date
         self.min_reviews = min_reviews
         self.search_tags = search_tags
+        self.excluded_steam_ids = excluded_steam_ids or []    # Games the user has hidden
 
 class Scoring:
     def __init__(self,
@@ -47,56 +55,156 @@ class Scoring:
 class Pagination:
     def __init__(self,
                  limit: int,
-                 offset: int):
+                 offset: int,
+                 after_score: float = None,
+                 after_steam_id: int = None,
+                 total_count: int = None):
         self.limit = limit
         self.offset = offset
+        self.after_score = after_score          # Seek past the game with this score and steam_id, instead of counting with offset
+        self.after_steam_id = after_steam_id
+        self.total_count = total_count          # Known from an earlier page, so it isn't counted again
 
 class GameCountryData:
     def __init__(self):
         self.prices: dict[str, Price] = { }      # Prices for each country (country code)
         self.delisted: set[str] = set()          # Countries game is delisted in (country code)
+        self.checked: set[str] = set()           # Countries that were scraped, the others are left as they are (country code)
+
+    def check(self, country_code: str):
+        self.checked.add(country_code)
 
     def delist(self, country_code: str):
         self.delisted.add(country_code)
 
+    def merge(self, other: "GameCountryData"):
+        """Adds data scraped later, replacing anything for the countries it checked"""
+        for country_code in other.checked:
+            self.prices.pop(country_code, None)
+        self.prices.update(other.prices)
+        self.delisted = (self.delisted - other.checked) | other.delisted
+        self.checked.update(other.checked)
+
     def add_price(self, country_code: str, price: Price):
         self.prices[country_code] = price
 
+class ConnectionPool:
+    """Connections for one event loop: a single writer, so writes queue up here instead of
+    fighting over SQLite's lock, and a pool of read-only connections that run alongside it (WAL)"""
+    pragmas = [
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",          # Safe with WAL, only the last commits can be lost on power loss
+        "PRAGMA cache_size = -32000",           # 32 MB page cache per connection
+        "PRAGMA mmap_size = 268435456",         # Read through 256 MB of memory mapped IO
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA busy_timeout = 10000",          # Wait on writers in other threads/processes instead of failing
+    ]
+
+    def __init__(self, db_path: str, max_readers: int):
+        self.db_path = db_path
+        self.max_readers = max_readers
+        self.readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self.reader_count = 0
+        self.write_conn: aiosqlite.Connection = None
+        self.writer_lock = asyncio.Lock()
+
+    async def _open(self, read_only: bool) -> aiosqlite.Connection:
+        # Statements are cached per connection, so reusing connections reuses prepared statements
+        conn = await aiosqlite.connect(self.db_path, cached_statements=256)
+        for pragma in self.pragmas:
+            await conn.execute(pragma)
+        if read_only:
+            await conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    @asynccontextmanager
+    async def reader(self):
+        if self.readers.empty() and self.reader_count < self.max_readers:
+            self.reader_count += 1
+            self.readers.put_nowait(await self._open(read_only=True))
+        conn = await self.readers.get()
+        try:
+            yield conn
+        finally:
+            self.readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Commits when the block exits, or rolls back if it raises"""
+        async with self.writer_lock:
+            if self.write_conn is None:
+                self.write_conn = await self._open(read_only=False)
+            try:
+                yield self.write_conn
+                await self.write_conn.commit()
+            except BaseException:
+                await self.write_conn.rollback()
+                raise
+
+    async def close(self):
+        if self.write_conn is not None:
+            # Move the WAL into the database file, so nothing is left behind only in the WAL
+            await self.write_conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            await self.write_conn.close()
+        while not self.readers.empty():
+            await self.readers.get_nowait().close()
+
 class Database:
     migrationsFolder = "Migrations"
 
-    def __init__(self, db_path: str = "games.db"):
+    def __init__(self, db_path: str = "games.db", max_readers: int = 4):
         self.db_path = db_path
+        self.max_readers = max_readers
+        # aiosqlite connections and asyncio locks are tied to an event loop, and the
+        # web server and scraping thread run their own, so each loop gets its own pool
+        self.pools: dict[asyncio.AbstractEventLoop, ConnectionPool] = {}
+
+    def _pool(self) -> ConnectionPool:
+        loop = asyncio.get_running_loop()
+        if loop not in self.pools:
+            self.pools[loop] = ConnectionPool(self.db_path, self.max_readers)
+        return self.pools[loop]
+
+    def _reader(self):
+        return self._pool().reader()
+
+    def _writer(self):
+        return self._pool().writer()
 
-    async def _connect(self) -> aiosqlite.Connection:
-        return await aiosqlite.connect(self.db_path)
+    async def close(self):
+        """Closes the connections of the running event loop. Call before the loop ends."""
+        pool = self.pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.close()
 
     async def init_database(self):
-        conn = await self._connect()
-        await self.run_migrations(conn)
-        await conn.commit()
-        await conn.close()
+        async with self._writer() as conn:
+            await self.run_migrations(conn)
     
     async def run_migrations(self, conn):
-        cursor = await conn.cursor()
-        await cursor.execute("PRAGMA user_version")
-        version = (await cursor.fetchone())[0]
-        migration_files = self.get_migration_files(version)
-        running_version = version
-        for file in migration_files:
-            running_version = file["version"]
+        """Runs each migration in its own transaction, so web and scraper worker processes
+        starting at the same time don't both run it"""
+        for file in self.get_migration_files(0):
+            await conn.execute("BEGIN IMMEDIATE")
             try:
+                cursor = await conn.execute("PRAGMA user_version")
+                if (await cursor.fetchone())[0] >= file["version"]:
+                    await conn.commit()
+                    continue
                 with open(join(self.migrationsFolder, file["file_name"]), 'r') as f:
                     sql = f.read()
-                    # Extract the UP section
-                    up_section = sql.split('-- Up')[1].split('-- Down')[0]
-                    await conn.executescript(up_section)
-                    await conn.commit()
-                version = running_version
-                dprint(f"Ran migration {version:03d}")
+                # Extract the UP section
+                up_section = sql.split('-- Up')[1].split('-- Down')[0]
+                # executescript would commit first, so the statements are run one by one
+                for statement in split_statements(up_section):
+                    await conn.execute(statement)
+                await conn.execute("PRAGMA user_version = {v:d}".format(v=file["version"]))
+                await conn.commit()
+                log.info("Ran migration", version=file["version"])
             except Exception as e:
-                dprint(f"ERROR! Unable to run migration {running_version:03d}: {e}")
-        await cursor.execute("PRAGMA user_version = {v:d}".format(v=version))
+                await conn.rollback()
+                log.error("Unable to run migration", version=file["version"], error=e)
+                break
     
     def get_migration_files(self, version: int) -> list:
         files = [{ "file_name": f, "version": int(f[:3])} for f in listdir(self.migrationsFolder) if isfile(join(self.migrationsFolder, f))]
@@ -107,130 +215,131 @@ class Database:
         filters: Filters,
         scoring: Scoring,
         pagination: Pagination
-    ) -> list[Game]:
-        conn = await self._connect()
-        conn.row_factory = aiosqlite.Row
-
-        cursor = await conn.cursor()
-
-        where_conditions = []
-        params = []
-        # Delisted
-        where_conditions.append("""
-            g.steam_id NOT IN (SELECT steam_id FROM GameDelisted WHERE country_code = ?)
-        """)
-        params.append(filters.country_code)
+    ) -> tuple[list[dict], int]:
+        """Returns (the page of games as /games response entries, total number of matching games)"""
+        # GameSearch has a row per country for every game that isn't delisted there, so no delisting check is needed
+        where_conditions = ["s.country_code = ?"]
+        params = [filters.country_code]
         
         # Player count
         if filters.player_type.lower() == 'couch':
-            where_conditions.append("g.couch_players BETWEEN ? AND ?")
+            where_conditions.append("s.couch_players BETWEEN ? AND ?")
         elif filters.player_type.lower() == 'lan':
-            where_conditions.append("g.lan_players BETWEEN ? AND ?")
+            where_conditions.append("s.lan_players BETWEEN ? AND ?")
         else:  # online
-            where_conditions.append("g.online_players BETWEEN ? AND ?")
+            where_conditions.append("s.online_players BETWEEN ? AND ?")
         params.extend([filters.min_supported_players, filters.max_supported_players])
 
         if not filters.free_games:
-            where_conditions.append("""
-                EXISTS (SELECT 1 FROM GamePrice gp WHERE gp.steam_id = g.steam_id 
-                        AND gp.country_code = ? AND gp.final_price > 0)
-            """)
-            params.append(filters.country_code)
+            where_conditions.append("s.final_price > 0")
 
         if not filters.unreleased_games:
-            where_conditions.append("g.is_released = 1")
+            where_conditions.append("s.is_released = 1")
 
         if filters.min_reviews > 0:
-            where_conditions.append("g.number_of_reviews >= ?")
+            where_conditions.append("s.number_of_reviews >= ?")
             params.append(filters.min_reviews)
 
         if filters.search_tags:
-            for tag in filters.search_tags:
-                where_conditions.append("g.tags LIKE ?")
-                params.append(f'%"{tag.lower()}"%')
+            # Games that have every one of the tags
+            tags = list({ tag.lower() for tag in filters.search_tags })
+            where_conditions.append(f"""
+                s.steam_id IN (SELECT steam_id FROM GameTag WHERE tag IN ({",".join("?" * len(tags))})
+                               GROUP BY steam_id HAVING COUNT(*) = ?)
+            """)
+            params.extend(tags + [len(tags)])
         
+        if filters.excluded_steam_ids:
+            # Bound as one JSON array, there can be more IDs than SQLite allows parameters
+            where_conditions.append("s.steam_id NOT IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(filters.excluded_steam_ids))
+
         if filters.from_date:
-            where_conditions.append("g.release_date >= ?")
+            where_conditions.append("s.release_date >= ?")
             params.append(filters.from_date.strftime("%Y-%m-%d"))
         if filters.to_date:
-            where_conditions.append("g.release_date <= ?")
+            where_conditions.append("s.release_date <= ?")
             params.append(filters.to_date.strftime("%Y-%m-%d"))
         
         where_clause = "WHERE " + " AND ".join(where_conditions)
 
-        score_calculation = f"""
+        # Weights are bound as parameters so the statement is reused between requests with the same filters
+        score_calculation = """
             (
-                (g.steam_rating * g.steam_rating) * {scoring.rating_weight} +
-                -(COALESCE(gp.final_price, 0) / 100.0 / {scoring.high_price}) * {scoring.price_weight} +
-                CASE 
-                    WHEN COALESCE(gp.initial_price, 0) > 0 
-                    THEN (1.0 - CAST(COALESCE(gp.final_price, 0) AS REAL) / COALESCE(gp.initial_price, 1)) * {scoring.sale_weight}
-                    ELSE 0 
-                END +
-                (LOG(g.number_of_reviews + 1) / LOG(100000)) * {scoring.number_of_reviews_weight}
+                s.rating_squared * ? +
+                -(COALESCE(s.final_price, 0) / 100.0 / ?) * ? +
+                s.discount * ? +
+                s.log_reviews * ?
             )
         """
+        score_params = [scoring.rating_weight, scoring.high_price, scoring.price_weight, scoring.sale_weight, scoring.number_of_reviews_weight]
+
+        # Ties are ordered by steam_id, so the last game of a page marks exactly where the next one starts
+        seek_clause = ""
+        seek_params = []
+        if pagination.after_score is not None:
+            seek_clause = "WHERE calculated_score < ? OR (calculated_score = ? AND steam_id > ?)"
+            seek_params = [pagination.after_score, pagination.after_score, pagination.after_steam_id]
 
+        # Only the games on the page are joined with Game for the rest of their data
         query = f"""
-            SELECT 
-                g.*,
-                gp.initial_price,
-                gp.final_price,
-                {score_calculation} as calculated_score,
-                COUNT(*) OVER() as total_count
-            FROM Game g
-            LEFT JOIN GamePrice gp ON g.steam_id = gp.steam_id AND gp.country_code = ?
-            {where_clause}
-            ORDER BY {score_calculation} DESC
-            LIMIT ? OFFSET ?
+            SELECT g.*, page.initial_price, page.final_price, page.calculated_score
+            FROM (
+                SELECT * FROM (
+                    SELECT 
+                        s.steam_id,
+                        s.initial_price,
+                        s.final_price,
+                        {score_calculation} as calculated_score
+                    FROM GameSearch s
+                    {where_clause}
+                )
+                {seek_clause}
+                ORDER BY calculated_score DESC, steam_id
+                LIMIT ? OFFSET ?
+            ) page
+            JOIN Game g ON g.steam_id = page.steam_id
+            ORDER BY page.calculated_score DESC, page.steam_id
         """
 
-        # Add country_code for price join as first parameter
-        all_params = [filters.country_code] + params + [pagination.limit, pagination.offset]
-        await cursor.execute(query, all_params)
-
-        games = []
-        total_count = 0
-
-        for row in await cursor.fetchall():
-            games.append(self._row_to_game(row))
-            total_count = row["total_count"]
+        all_params = score_params + params + seek_params + [pagination.limit, pagination.offset]
+        with games_phase_seconds.time(("query",)):
+            async with self._reader() as conn:
+                cursor = await conn.cursor()
+                cursor.row_factory = aiosqlite.Row
+                await cursor.execute(query, all_params)
+                rows = await cursor.fetchall()
 
-        await conn.close()
+                total_count = pagination.total_count
+                if total_count is None:
+                    await cursor.execute(f"SELECT COUNT(*) FROM GameSearch s {where_clause}", params)
+                    total_count = (await cursor.fetchone())[0]
 
-        return games, total_count
+        with games_phase_seconds.time(("conversion",)):
+            return [game_response(row) for row in rows], total_count
 
     async def save_games(self, games: list[Game]):
-        conn = await self._connect()
-        cursor = await conn.cursor()
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
 
-        for game in games:
-            await self.save_game_batch(game, cursor)
-
-        await conn.commit()
-        await conn.close()
+            await self.save_game_batch(games, cursor)
     
     async def save_game(self, game: Game):
-        conn = await self._connect()
-        cursor = await conn.cursor()
-
-        await self.save_game_batch(game, cursor)
-
-        await conn.commit()
-        await conn.close()
+        await self.save_games([game])
 
-    async def save_game_batch(self, game: Game, cursor: aiosqlite.Cursor):
-        await cursor.execute("""
+    async def save_game_batch(self, games: list[Game], cursor: aiosqlite.Cursor):
+        await cursor.executemany("""
                INSERT INTO Game (
-                    title, steam_id, steam_rating, number_of_reviews, release_date,
+                    title, steam_id, steam_rating, number_of_reviews, release_date, release_date_text,
                     couch_players, lan_players, online_players, cooptimus_url, steam_url,
                     header_image, short_description, tags, is_released, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
                 ON CONFLICT(steam_id) DO UPDATE SET
                     title = excluded.title,
                     steam_rating = excluded.steam_rating,
                     number_of_reviews = excluded.number_of_reviews,
                     release_date = excluded.release_date,
+                    release_date_text = excluded.release_date_text,
                     couch_players = excluded.couch_players,
                     lan_players = excluded.lan_players,
                     online_players = excluded.online_players,
@@ -241,42 +350,470 @@ class Database:
                     tags = excluded.tags,
                     is_released = excluded.is_released,
                     updated_at = CURRENT_TIMESTAMP
-            """, (
+            """, [(
                 game.title, game.steam_id, game.steam_rating, game.number_of_reviews,
                 game.release_date.strftime("%Y-%m-%d") if game.release_date else None,
+                game.release_date.strftime(release_date_format) if game.release_date else None,
                 game.couch_players, game.lan_players, game.online_players,
                 game.cooptimus_url, game.steam_url, game.header_image,
                 game.short_description, json.dumps(game.tags), game.is_released
-            ))
-
-        # TODO temp
-        dprint(f"Imported {game.title}")
-
-    async def save_country_data(self, countries_data: dict[int, GameCountryData]):
-        conn = await self._connect()
-        cursor = await conn.cursor()
+            ) for game in games])
 
-        for steam_id, country_data in countries_data.items():
-            for country_code, price in country_data.prices.items():
-                await cursor.execute("""
-                        INSERT OR REPLACE INTO GamePrice (steam_id, country_code, initial_price, final_price)
-                        VALUES (?, ?, ?, ?)
-                    """, (steam_id, country_code, price.initial, price.final))
+        await cursor.executemany("DELETE FROM GameTag WHERE steam_id = ?", [(game.steam_id,) for game in games])
+        await cursor.executemany("INSERT OR IGNORE INTO GameTag (tag, steam_id) VALUES (?, ?)",
+            [(tag.lower(), game.steam_id) for game in games for tag in game.tags])
 
-            await cursor.execute("DELETE FROM GameDelisted WHERE steam_id = ?", (steam_id,))
-            for country_code in country_data.delisted:
-                await cursor.execute("""
-                        INSERT OR REPLACE INTO GameDelisted (steam_id, country_code)
-                        VALUES (?, ?)
-                    """, (steam_id, country_code))
+        await self.bump_generation(cursor)
 
-        await conn.commit()
-        await conn.close()
+        for game in games:
+            log.debug("Imported game", title=game.title, steam_id=game.steam_id)
+
+    async def get_game_sources(self, steam_ids: list[int]) -> dict[int, dict[str, tuple]]:
+        """Returns steam_id -> source -> (fingerprint, days since checked) for the games that have been scraped before"""
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                    SELECT steam_id, source, fingerprint, julianday('now') - julianday(checked_at)
+                    FROM GameSource WHERE steam_id IN (SELECT value FROM json_each(?))
+                """, (json.dumps(steam_ids),))
+            sources = {}
+            for steam_id, source, fingerprint, age in await cursor.fetchall():
+                sources.setdefault(steam_id, {})[source] = (fingerprint, age)
+        return sources
+
+    async def get_games_by_steam_ids(self, steam_ids: list[int]) -> dict[int, Game]:
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            cursor.row_factory = aiosqlite.Row
+            await cursor.execute("""
+                    SELECT *, 0 AS calculated_score FROM Game
+                    WHERE steam_id IN (SELECT value FROM json_each(?))
+                """, (json.dumps(steam_ids),))
+            games = { row['steam_id']: self._row_to_game(row) for row in await cursor.fetchall() }
+        return games
+
+    async def save_game_sources_batch(self, game_sources: list[tuple], cursor: aiosqlite.Cursor):
+        await cursor.executemany("""
+                INSERT OR REPLACE INTO GameSource (steam_id, source, fingerprint, checked_at)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            """, game_sources)
 
-        # TODO temp
-        dprint(f"Saved {len(countries_data)} prices")
+    async def save_country_data(self, countries_data: dict[int, GameCountryData]):
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+
+            await self.save_country_data_batch(countries_data, cursor)
+
+    async def save_country_data_batch(self, countries_data: dict[int, GameCountryData], cursor: aiosqlite.Cursor):
+        await cursor.executemany("""
+                INSERT OR REPLACE INTO GamePrice (steam_id, country_code, initial_price, final_price)
+                VALUES (?, ?, ?, ?)
+            """, [(steam_id, country_code, price.initial, price.final)
+                for steam_id, country_data in countries_data.items()
+                for country_code, price in country_data.prices.items()])
+
+        await cursor.executemany("DELETE FROM GameDelisted WHERE steam_id = ? AND country_code = ?",
+            [(steam_id, country_code)
+                for steam_id, country_data in countries_data.items()
+                for country_code in country_data.checked])
+
+        await cursor.executemany("""
+                INSERT OR REPLACE INTO GameDelisted (steam_id, country_code)
+                VALUES (?, ?)
+            """, [(steam_id, country_code)
+                for steam_id, country_data in countries_data.items()
+                for country_code in country_data.delisted])
+
+        await self.bump_generation(cursor)
+
+        log.debug("Saved prices", games=len(countries_data))
+
+    async def rebuild_search_table(self, country_codes: list[str]):
+        """Rebuilds GameSearch from the games, prices and delistings. Searches see the old
+        table until the new one is committed as a whole."""
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("DELETE FROM GameSearch")
+            await cursor.execute(f"""
+                    INSERT INTO GameSearch
+                    SELECT
+                        c.value, g.steam_id, g.couch_players, g.lan_players, g.online_players, g.is_released,
+                        g.number_of_reviews, g.release_date, gp.initial_price, gp.final_price,
+                        CASE
+                            WHEN COALESCE(gp.initial_price, 0) > 0
+                            THEN 1.0 - CAST(COALESCE(gp.final_price, 0) AS REAL) / gp.initial_price
+                            ELSE 0
+                        END,
+                        g.steam_rating * g.steam_rating,
+                        LOG(g.number_of_reviews + 1) / LOG(100000)
+                    FROM json_each(?) c
+                    CROSS JOIN Game g
+                    LEFT JOIN GamePrice gp ON gp.steam_id = g.steam_id AND gp.country_code = c.value
+                    WHERE NOT EXISTS (SELECT 1 FROM GameDelisted d WHERE d.steam_id = g.steam_id AND d.country_code = c.value)
+                """, (json.dumps(country_codes),))
+            await self.bump_generation(cursor)
+        log.info("Rebuilt search table", countries=len(country_codes))
+
+    async def bump_generation(self, cursor: aiosqlite.Cursor):
+        await cursor.execute("UPDATE DataGeneration SET generation = generation + 1")
+
+    async def get_generation(self) -> int:
+        """Counter that changes with every commit to games, prices or delistings"""
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("SELECT generation FROM DataGeneration")
+            generation = (await cursor.fetchone())[0]
+        return generation
+
+    async def get_search_games(self) -> tuple[int, list, list[tuple]]:
+        """Returns (generation, games ordered by steam_id, (steam_id, tag) pairs), all read from the same snapshot"""
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            cursor.row_factory = aiosqlite.Row
+            await cursor.execute("BEGIN")
+            try:
+                await cursor.execute("SELECT generation FROM DataGeneration")
+                generation = (await cursor.fetchone())[0]
+                await cursor.execute("SELECT * FROM Game ORDER BY steam_id")
+                games = await cursor.fetchall()
+                await cursor.execute("SELECT steam_id, tag FROM GameTag")
+                tags = [tuple(row) for row in await cursor.fetchall()]
+            finally:
+                await cursor.execute("COMMIT")
+        return generation, games, tags
+
+    async def get_search_country(self, country_code: str) -> tuple[int, list[tuple], list[int]]:
+        """Returns (generation, (steam_id, initial_price, final_price) rows, delisted steam_ids) for a country"""
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("BEGIN")
+            try:
+                await cursor.execute("SELECT generation FROM DataGeneration")
+                generation = (await cursor.fetchone())[0]
+                await cursor.execute("SELECT steam_id, initial_price, final_price FROM GamePrice WHERE country_code = ?", (country_code,))
+                prices = await cursor.fetchall()
+                await cursor.execute("SELECT steam_id FROM GameDelisted WHERE country_code = ?", (country_code,))
+                delisted = [row[0] for row in await cursor.fetchall()]
+            finally:
+                await cursor.execute("COMMIT")
+        return generation, prices, delisted
+
+    async def write_batch(self,
+        games: list[Game],
+        game_sources: list[tuple],
+        countries_data: dict[int, GameCountryData],
+        price_refreshes: dict[str, dict[int, Price]],
+        completed_job_items: list[tuple]
+    ):
+        """Writes everything the scraper has buffered up in a single transaction.
+        Completed job items are (job_id, stage, item), committed together with the data they produced.
+        Game sources are (steam_id, source, fingerprint) checked by the scrape."""
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+
+            # Price changes are found by comparing to the stored prices, so this goes before saving the new ones
+            for region_code, prices in price_refreshes.items():
+                await self.save_price_refresh_batch(region_code, prices, cursor)
+            if games:
+                await self.save_game_batch(games, cursor)
+            if game_sources:
+                await self.save_game_sources_batch(game_sources, cursor)
+            if countries_data:
+                await self.save_country_data_batch(countries_data, cursor)
+            await self.complete_job_items_batch(completed_job_items, cursor)
+
+    async def get_price_regions(self, max_age_days: int) -> dict[str, str]:
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                    SELECT country_code, region_code FROM PriceRegion
+                    WHERE checked_at >= datetime('now', ?)
+                """, (f"-{max_age_days} days",))
+            regions = { row[0]: row[1] for row in await cursor.fetchall() }
+        return regions
+
+    async def save_price_regions(self, regions: dict[str, str]):
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+
+            await cursor.execute("DELETE FROM PriceRegion")
+            await cursor.execute("""
+                    DELETE FROM GamePriceRefresh WHERE region_code NOT IN ({})
+                """.format(",".join("?" * len(set(regions.values())))), list(set(regions.values())))
+            await cursor.executemany("""
+                    INSERT INTO PriceRegion (country_code, region_code)
+                    VALUES (?, ?)
+                """, list(regions.items()))
+
+    async def get_discovery_windows(self, window_keys: list[str]) -> dict[str, tuple]:
+        """Returns window_key -> (fingerprint, games, days since checked) for the windows that have been fetched before"""
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                    SELECT window_key, fingerprint, games, julianday('now') - julianday(checked_at)
+                    FROM DiscoveryWindow WHERE window_key IN (SELECT value FROM json_each(?))
+                """, (json.dumps(window_keys),))
+            windows = { row[0]: (row[1], json.loads(row[2]), row[3]) for row in await cursor.fetchall() }
+        return windows
+
+    async def save_discovery_windows(self, windows: dict[str, tuple]):
+        """Saves window_key -> (fingerprint, games)"""
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+            await cursor.executemany("""
+                    INSERT OR REPLACE INTO DiscoveryWindow (window_key, fingerprint, games, checked_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, [(key, fingerprint, json.dumps(games)) for key, (fingerprint, games) in windows.items()])
+
+    async def get_price_refresh_candidates(self, region_code: str) -> list[tuple]:
+        """Returns (steam_id, checked_at, changed_at, on_sale, release_date, impressions) for every game.
+        Times are unix timestamps, or None if the game's price has never been checked/changed."""
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                    SELECT g.steam_id,
+                        CAST(strftime('%s', r.checked_at) AS INTEGER),
+                        CAST(strftime('%s', r.changed_at) AS INTEGER),
+                        COALESCE(r.on_sale, 0),
+                        CAST(strftime('%s', g.release_date) AS INTEGER),
+                        COALESCE(p.impressions, 0)
+                    FROM Game g
+                    LEFT JOIN GamePriceRefresh r ON r.steam_id = g.steam_id AND r.region_code = ?
+                    LEFT JOIN GamePopularity p ON p.steam_id = g.steam_id
+                """, (region_code,))
+            rows = await cursor.fetchall()
+        return rows
+
+    async def save_price_refresh(self, region_code: str, prices: dict[int, Price]):
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+
+            await self.save_price_refresh_batch(region_code, prices, cursor)
+
+    async def save_price_refresh_batch(self, region_code: str, prices: dict[int, Price], cursor: aiosqlite.Cursor):
+        """Marks prices as checked for the region, and as changed where they differ from the stored ones.
+        Price is None for games that are unavailable or have no price in the region."""
+        steam_ids = list(prices.keys())
+        await cursor.execute("""
+                SELECT steam_id, initial_price, final_price FROM GamePrice
+                WHERE country_code = ? AND steam_id IN ({})
+            """.format(",".join("?" * len(steam_ids))), [region_code] + steam_ids)
+        old_prices = { row[0]: (row[1], row[2]) for row in await cursor.fetchall() }
+
+        rows = []
+        for steam_id, price in prices.items():
+            new_price = (price.initial, price.final) if price else None
+            changed = old_prices.get(steam_id) != new_price
+            on_sale = price is not None and price.final < price.initial
+            rows.append((steam_id, region_code, changed, on_sale))
+
+        await cursor.executemany("""
+                INSERT INTO GamePriceRefresh (steam_id, region_code, checked_at, changed_at, on_sale)
+                VALUES (?, ?, CURRENT_TIMESTAMP, CASE WHEN ?3 THEN CURRENT_TIMESTAMP END, ?4)
+                ON CONFLICT(steam_id, region_code) DO UPDATE SET
+                    checked_at = excluded.checked_at,
+                    changed_at = COALESCE(excluded.changed_at, changed_at),
+                    on_sale = excluded.on_sale
+            """, rows)
+
+    async def add_impressions(self, impressions: dict[int, int]):
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+
+            await cursor.executemany("""
+                    INSERT INTO GamePopularity (steam_id, impressions) VALUES (?, ?)
+                    ON CONFLICT(steam_id) DO UPDATE SET impressions = impressions + excluded.impressions
+                """, list(impressions.items()))
+
+    async def create_scrape_job(self, full_scrape: bool) -> int:
+        """Returns the id of the new job, or None if a job is already running"""
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                    INSERT INTO ScrapeJob (full_scrape)
+                    SELECT ? WHERE NOT EXISTS (SELECT 1 FROM ScrapeJob WHERE status = 'running')
+                """, (full_scrape,))
+            job_id = cursor.lastrowid if cursor.rowcount else None
+        return job_id
+
+    async def get_scrape_job(self, status: str) -> tuple:
+        """Returns (id, full_scrape, unix started_at, unix finished_at, attempts) of the latest job with status, or None"""
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                    SELECT id, full_scrape, CAST(strftime('%s', started_at) AS INTEGER), CAST(strftime('%s', finished_at) AS INTEGER), attempts
+                    FROM ScrapeJob WHERE status = ? ORDER BY id DESC LIMIT 1
+                """, (status,))
+            row = await cursor.fetchone()
+        return row
+
+    async def has_completed_full_scrape(self) -> bool:
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("SELECT EXISTS (SELECT 1 FROM ScrapeJob WHERE status = 'completed' AND full_scrape = 1)")
+            result = bool((await cursor.fetchone())[0])
+        return result
+
+    async def get_last_scrape_finished_at(self) -> int:
+        """Returns the unix time the latest completed or failed job finished, or None"""
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("SELECT CAST(strftime('%s', MAX(finished_at)) AS INTEGER) FROM ScrapeJob WHERE status != 'running'")
+            finished_at = (await cursor.fetchone())[0]
+        return finished_at
+
+    async def finish_scrape_job(self, job_id: int, status: str, error: str = None):
+        """Ends the running job as completed or failed, recording the error if there was one"""
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                    UPDATE ScrapeJob SET status = ?, last_error = ?, finished_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND status = 'running'
+                """, (status, error, job_id))
+            await cursor.execute("DELETE FROM ScrapeJobItem WHERE job_id = ?", (job_id,))
+
+    async def fail_scrape_job_attempt(self, job_id: int, error: str, attempts: int) -> tuple[str, int]:
+        """Records the error of a failed attempt at the running job, which is left running to be resumed.
+        attempts is the count the worker resumed the job at, so when several workers fail the same attempt
+        only the first one counts it. Returns (status, attempts) of the job."""
+        async with self._writer() as conn:
+            await conn.execute("""
+                    UPDATE ScrapeJob SET last_error = ?, attempts = attempts + 1
+                    WHERE id = ? AND status = 'running' AND attempts = ?
+                """, (error, job_id, attempts))
+            cursor = await conn.execute("SELECT status, attempts FROM ScrapeJob WHERE id = ?", (job_id,))
+            row = await cursor.fetchone()
+        return row
+
+    async def start_job_stage(self, job_id: int, stage: str) -> bool:
+        """Starts or resumes a stage. Returns False if the stage is already completed.
+        Items that failed too many times in an earlier attempt at the stage are tried again."""
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                    UPDATE ScrapeJobItem SET attempts = 0
+                    WHERE job_id = ? AND stage = ? AND done = 0 AND COALESCE(lease_expires_at, 0) < ?
+                """, (job_id, stage, time.time()))
+            await cursor.execute("""
+                    INSERT INTO ScrapeJobStage (job_id, stage) VALUES (?, ?)
+                    ON CONFLICT(job_id, stage) DO UPDATE SET
+                        started_at = CURRENT_TIMESTAMP,
+                        done_at_start = (SELECT COUNT(*) FROM ScrapeJobItem i WHERE i.job_id = excluded.job_id AND i.stage = excluded.stage AND i.done = 1)
+                """, (job_id, stage))
+            await cursor.execute("SELECT status FROM ScrapeJobStage WHERE job_id = ? AND stage = ?", (job_id, stage))
+            status = (await cursor.fetchone())[0]
+        return status != 'completed'
+
+    async def complete_job_stage(self, job_id: int, stage: str):
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("UPDATE ScrapeJobStage SET status = 'completed' WHERE job_id = ? AND stage = ?", (job_id, stage))
+
+    async def add_job_items(self, job_id: int, stage: str, items: dict[str, str]):
+        """Adds items (item key -> JSON payload) to a stage, keeping the progress of existing ones"""
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+            await cursor.executemany("""
+                    INSERT OR IGNORE INTO ScrapeJobItem (job_id, stage, item, payload) VALUES (?, ?, ?, ?)
+                """, [(job_id, stage, item, payload) for item, payload in items.items()])
+
+    async def get_job_items(self, job_id: int, stage: str) -> list[tuple]:
+        """Returns (item, payload, done) for every item in the stage"""
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("SELECT item, payload, done FROM ScrapeJobItem WHERE job_id = ? AND stage = ? ORDER BY rowid", (job_id, stage))
+            rows = await cursor.fetchall()
+        return rows
+
+    async def complete_job_items(self, job_id: int, stage: str, items: list[str]):
+        async with self._writer() as conn:
+            cursor = await conn.cursor()
+            await self.complete_job_items_batch([(job_id, stage, item) for item in items], cursor)
+
+    async def complete_job_items_batch(self, items: list[tuple], cursor: aiosqlite.Cursor):
+        await cursor.executemany("UPDATE ScrapeJobItem SET done = 1, lease_expires_at = NULL WHERE job_id = ? AND stage = ? AND item = ?", items)
+        for _, stage, _ in items:
+            job_items_completed.inc((stage,))
+
+    async def claim_job_items(self, job_id: int, stage: str, worker_id: str, count: int, lease_seconds: float, max_attempts: int) -> list[tuple]:
+        """Leases up to count items of the stage that aren't done, leased or out of attempts to the worker.
+        Returns (item, payload) of the claimed items."""
+        async with self._writer() as conn:
+            now = time.time()
+            cursor = await conn.execute("""
+                    UPDATE ScrapeJobItem SET leased_by = ?, lease_expires_at = ?, attempts = attempts + 1
+                    WHERE rowid IN (
+                        SELECT rowid FROM ScrapeJobItem
+                        WHERE job_id = ? AND stage = ? AND done = 0 AND attempts < ? AND COALESCE(lease_expires_at, 0) < ?
+                        ORDER BY rowid LIMIT ?
+                    )
+                    RETURNING item, payload
+                """, (worker_id, now + lease_seconds, job_id, stage, max_attempts, now, count))
+            rows = await cursor.fetchall()
+        return rows
+
+    async def release_job_items(self, job_id: int, stage: str, worker_id: str):
+        """Lets other workers claim the items the worker has leased but not finished right away"""
+        async with self._writer() as conn:
+            await conn.execute("""
+                    UPDATE ScrapeJobItem SET lease_expires_at = NULL
+                    WHERE job_id = ? AND stage = ? AND leased_by = ? AND done = 0
+                """, (job_id, stage, worker_id))
+
+    async def get_job_item_counts(self, job_id: int, stage: str, max_attempts: int) -> tuple[int, int, int]:
+        """Returns the number of (unfinished, leased, claimable) items in the stage"""
+        async with self._reader() as conn:
+            cursor = await conn.execute("""
+                    SELECT
+                        COUNT(*),
+                        COALESCE(SUM(COALESCE(lease_expires_at, 0) >= ?1), 0),
+                        COALESCE(SUM(COALESCE(lease_expires_at, 0) < ?1 AND attempts < ?2), 0)
+                    FROM ScrapeJobItem WHERE job_id = ?3 AND stage = ?4 AND done = 0
+                """, (time.time(), max_attempts, job_id, stage))
+            counts = await cursor.fetchone()
+        return counts
+
+    async def save_scrape_worker(self, worker_id: str, job_id: int, state: str, stats: dict, lease_seconds: float):
+        """Records what the worker is doing and extends the leases of the items it's working on"""
+        async with self._writer() as conn:
+            now = time.time()
+            await conn.execute("""
+                    INSERT OR REPLACE INTO ScrapeWorker (worker_id, job_id, state, stats, heartbeat_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (worker_id, job_id, state, json.dumps(stats), now))
+            await conn.execute("""
+                    UPDATE ScrapeJobItem SET lease_expires_at = ?
+                    WHERE leased_by = ? AND done = 0 AND lease_expires_at >= ?
+                """, (now + lease_seconds, worker_id, now))
+            # Workers that stopped a day ago won't be back
+            await conn.execute("DELETE FROM ScrapeWorker WHERE heartbeat_at < ?", (now - 86400,))
+
+    async def get_scrape_workers(self, max_age_seconds: float) -> list[tuple]:
+        """Returns (worker_id, job_id, state, stats) of the workers that have been heard from within max_age_seconds"""
+        async with self._reader() as conn:
+            cursor = await conn.execute("""
+                    SELECT worker_id, job_id, state, stats FROM ScrapeWorker
+                    WHERE heartbeat_at >= ? ORDER BY worker_id
+                """, (time.time() - max_age_seconds,))
+            workers = [(worker_id, job_id, state, json.loads(stats) if stats else None) for worker_id, job_id, state, stats in await cursor.fetchall()]
+        return workers
+
+    async def get_job_progress(self, job_id: int) -> list[tuple]:
+        """Returns (stage, status, total items, done items, done at start, seconds since start) for each stage of the job"""
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("""
+                    SELECT s.stage, s.status, COUNT(i.item), COALESCE(SUM(i.done), 0), s.done_at_start,
+                        (julianday('now') - julianday(s.started_at)) * 86400
+                    FROM ScrapeJobStage s
+                    LEFT JOIN ScrapeJobItem i ON i.job_id = s.job_id AND i.stage = s.stage
+                    WHERE s.job_id = ?
+                    GROUP BY s.stage
+                    ORDER BY s.rowid
+                """, (job_id,))
+            rows = await cursor.fetchall()
+        return rows
 
-    
     def _row_to_game(self, row) -> Game:
         game = Game()
         game.title = row['title']
@@ -305,23 +842,33 @@ class Database:
         return game
 
     async def get_total_games_count(self) -> int:
-        conn = await self._connect()
-        cursor = await conn.cursor()
-        await cursor.execute("SELECT COUNT(*) FROM Game")
-        count = (await cursor.fetchone())[0]
-        await conn.close()
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("SELECT COUNT(*) FROM Game")
+            count = (await cursor.fetchone())[0]
         return count
 
     async def get_all_steam_ids(self) -> list[int]:
-        conn = await self._connect()
-        cursor = await conn.cursor()
-        await cursor.execute("SELECT steam_id FROM Game")
-        rows = await cursor.fetchall()
-        steam_ids = [row[0] for row in rows]
-        await conn.close()
+        async with self._reader() as conn:
+            cursor = await conn.cursor()
+            await cursor.execute("SELECT steam_id FROM Game")
+            rows = await cursor.fetchall()
+            steam_ids = [row[0] for row in rows]
         return steam_ids
 
 
+# SQL timing of every method, in both the web server and the scraper workers
+time_methods(Database, database_seconds)
+
+def split_statements(script: str) -> list[str]:
+    statements, statement = [], ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement)
+            statement = ""
+    return statements
+
 # TODO REMOVE TESTING STUFF
 def get_date(dateStr):
     return datetime.strptime(dateStr, "%Y-%m-%d").date()
@@ -355,9 +902,10 @@ async def test():
     
     games, count = await db.get_games(filters, scoring, pagination)
     for game in games:
-        dprint(f"{game.title} - {game.steam_rating}")
-    dprint(f"Total: {count}")
+        log.info("Game", title=game["title"], steam_rating=game["steam_rating"])
+    log.info("Total", games=count)
     #await db.save_games(load_games_from_file())
+    await db.close()
     
 if __name__ == "__main__":
     asyncio.run(test())
\ No newline at end of file
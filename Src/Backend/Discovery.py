@@ -0,0 +1,144 @@
+import calendar
+import hashlib
+import json
+from datetime import datetime
+from typing import Awaitable, Callable
+from AsyncUtils import gather_all
+from Database import Database
+from Log import get_logger
+
+log = get_logger("Discovery")
+
+class DiscoveryWindow:
+	"""Range of release dates to search Co-Optimus for: a year, a month or a day"""
+	def __init__(self, year: int, month: int = None, day: int = None):
+		self.year = year
+		self.month = month
+		self.day = day
+
+	@property
+	def level(self) -> int:
+		return 0 if self.month is None else 1 if self.day is None else 2
+
+	@property
+	def key(self) -> str:
+		return "-".join(f"{part:02d}" for part in (self.year, self.month, self.day) if part is not None)
+
+	def params(self) -> dict:
+		params = { "releaseyear": self.year }
+		if self.month is not None:
+			params["releasemonth"] = self.month
+		if self.day is not None:
+			params["releaseday"] = self.day
+		return params
+
+	def split(self) -> list["DiscoveryWindow"]:
+		"""Smaller windows covering this one, or none if it can't be split"""
+		if self.month is None:
+			return [DiscoveryWindow(self.year, month) for month in range(1, 13)]
+		if self.day is None:
+			return [DiscoveryWindow(self.year, self.month, day) for day in range(1, calendar.monthrange(self.year, self.month)[1] + 1)]
+		return []
+
+	def descendants(self) -> list["DiscoveryWindow"]:
+		children = self.split()
+		return children + [descendant for child in children for descendant in child.descendants()]
+
+def fingerprint(games: list[dict]) -> str:
+	return hashlib.sha1(json.dumps(sorted(games, key=json.dumps), sort_keys=True).encode()).hexdigest()
+
+class CoopDiscovery:
+	"""Finds every game on Co-Optimus by searching release date windows.
+	Co-Optimus returns at most result_cap games per search, so only windows that hit the cap are
+	split into smaller ones (year -> month -> day), and all windows are searched concurrently.
+	The split of a capped window is skipped when the window returns the same games as last time,
+	then its smaller windows' games are reused from the last run (until they are recheck_days old).
+	Recent years are always searched in full, that's where new games show up."""
+	result_cap = 40
+	recheck_days = 7
+	recent_years = 2
+
+	def __init__(self, database: Database, search: Callable[[dict], Awaitable[list[dict]]]):
+		self.database = database
+		self.search = search						# Searches Co-Optimus with the params of a window
+		self.fetched: dict[str, tuple] = {}
+		self.stats: dict[str, int] = {}
+		self.unsupported_levels: set[int] = set()		# Window levels Co-Optimus turned out not to narrow the search by
+
+	async def discover(self, windows: list[DiscoveryWindow]) -> list[dict]:
+		"""Returns the games found in the windows, may contain duplicates"""
+		self.fetched = {}
+		self.stats = { "searched": 0, "split": 0, "reused": 0, "truncated": 0 }
+
+		games = []
+		for window_games in await gather_all(*[self.discover_window(window) for window in windows]):
+			games.extend(window_games)
+
+		await self.database.save_discovery_windows(self.fetched)
+		log.info("Discovered games", games=len(games), **self.stats)
+		return games
+
+	async def discover_window(self, window: DiscoveryWindow) -> list[dict]:
+		games, games_fingerprint = await self.search_window(window)
+		return await self.split_window(window, games, games_fingerprint)
+
+	async def search_window(self, window: DiscoveryWindow) -> tuple[list[dict], str]:
+		games = await self.search(window.params())
+		games_fingerprint = fingerprint(games)
+		self.stats["searched"] += 1
+		self.fetched[window.key] = (games_fingerprint, games)
+		return games, games_fingerprint
+
+	async def split_window(self, window: DiscoveryWindow, games: list[dict], games_fingerprint: str) -> list[dict]:
+		"""Adds the games of smaller windows if the window hit the result cap"""
+		if len(games) < self.result_cap:
+			return games
+
+		children = window.split()
+		if not children or children[0].level in self.unsupported_levels:
+			log.warning("Window has more games than a search returns and can't be split further, some are missing", window=window.key, result_cap=self.result_cap)
+			self.stats["truncated"] += 1
+			return games
+
+		reused = await self.reuse_children(window, games_fingerprint, children)
+		if reused is not None:
+			self.stats["reused"] += 1
+			return games + reused
+
+		self.stats["split"] += 1
+		searched = await gather_all(*[self.search_window(child) for child in children])
+		if all(child_fingerprint == games_fingerprint for _, child_fingerprint in searched):
+			# Every smaller window returning the same games means Co-Optimus ignores the narrower search
+			self.unsupported_levels.add(children[0].level)
+			log.warning("Window has more games than a search returns and can't be split further, some are missing", window=window.key, result_cap=self.result_cap)
+			self.stats["truncated"] += 1
+			return games
+
+		results = await gather_all(*[self.split_window(child, *result) for child, result in zip(children, searched)])
+		return games + [game for child_games in results for game in child_games]
+
+	async def reuse_children(self, window: DiscoveryWindow, games_fingerprint: str, children: list[DiscoveryWindow]) -> list[dict]:
+		"""Returns the games of the last run's smaller windows if the window is unchanged since then, otherwise None"""
+		if window.year > datetime.now().year - self.recent_years:
+			return None
+		stored = await self.database.get_discovery_windows([window.key] + [descendant.key for descendant in window.descendants()])
+		if stored.get(window.key, (None,))[0] != games_fingerprint:
+			return None
+
+		def stored_games(windows: list[DiscoveryWindow]) -> list[dict]:
+			games = []
+			for child in windows:
+				if child.key not in stored or stored[child.key][2] > self.recheck_days:
+					return None
+				child_games = stored[child.key][1]
+				games.extend(child_games)
+				# Capped windows were split last time too
+				grandchildren = child.split()
+				if len(child_games) >= self.result_cap and grandchildren and grandchildren[0].level not in self.unsupported_levels:
+					grandchildren_games = stored_games(grandchildren)
+					if grandchildren_games is None:
+						return None
+					games.extend(grandchildren_games)
+			return games
+
+		return stored_games(children)
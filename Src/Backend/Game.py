@@ -1,27 +1,44 @@
 
+import json
 import math
 from datetime import datetime, date
 from Price import Price
 
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+loads = orjson.loads if orjson else json.loads
+
+release_date_format = "%d %b, %Y"
+
 class Game:
-	title: str = ""
-	steam_id: int = -1					# Steam's app ID
-	price: Price = None					# Price for region that was requested. Used during game retrieval.
-	steam_rating: float = 0				# 0.0–1.0 float (e.g., 0.85)
-	number_of_reviews: int = 0
-	release_date: date = None			# Date time
-	couch_players: int = 0				# Supported couch players
-	lan_players: int = 0				# Supported LAN players
-	online_players: int = 0				# Supported online players
-	cooptimus_url: str = ""
-	steam_url: str = ""
-	header_image: str = None
-	short_description: str = ""
-	tags: list[str] = []
-	is_released: bool = True
-	score: float = 0  					# Calculated score when retrieved
+	__slots__ = (
+		"title", "steam_id", "price", "steam_rating", "number_of_reviews", "release_date",
+		"couch_players", "lan_players", "online_players", "cooptimus_url", "steam_url",
+		"header_image", "short_description", "tags", "is_released", "score", "is_removed", "prices",
+	)
 
-	is_removed: bool = True 			# Only used temporarily while scraping, games with this set to true will be discarded
+	def __init__(self):
+		self.title: str = ""
+		self.steam_id: int = -1						# Steam's app ID
+		self.price: Price = None					# Price for region that was requested. Used during game retrieval.
+		self.steam_rating: float = 0				# 0.0–1.0 float (e.g., 0.85)
+		self.number_of_reviews: int = 0
+		self.release_date: date = None				# Date time
+		self.couch_players: int = 0					# Supported couch players
+		self.lan_players: int = 0					# Supported LAN players
+		self.online_players: int = 0				# Supported online players
+		self.cooptimus_url: str = ""
+		self.steam_url: str = ""
+		self.header_image: str = None
+		self.short_description: str = ""
+		self.tags: list[str] = []
+		self.is_released: bool = True
+		self.score: float = 0						# Calculated score when retrieved
+
+		self.is_removed: bool = True 				# Only used temporarily while scraping, games with this set to true will be discarded
 	
 	def to_dict(self):
 		return {
@@ -32,7 +49,7 @@ class Game:
 			"steam_rating": self.steam_rating,
 			"number_of_reviews": self.number_of_reviews,
 			"is_released": self.is_released,
-			"release_date": self.release_date.strftime("%d %b, %Y") if self.is_released else None,
+			"release_date": self.release_date.strftime(release_date_format) if self.is_released else None,
 			"couch_players": self.couch_players,
 			"lan_players": self.lan_players,
 			"online_players": self.online_players,
@@ -55,7 +72,7 @@ class Game:
 		obj.is_released = bool(data["is_released"])
 		date_string = data.get("release_date")
 		if obj.is_released and date_string:
-			obj.release_date = datetime.strptime(date_string, "%d %b, %Y").date()
+			obj.release_date = datetime.strptime(date_string, release_date_format).date()
 		else:
 			obj.release_date = None
 		obj.couch_players = int(data["couch_players"])
@@ -66,4 +83,30 @@ class Game:
 		obj.header_image = data["header_image"]
 		obj.short_description = data["short_description"]
 		obj.tags = data.get("tags", [])
-		return obj
\ No newline at end of file
+		return obj
+
+def game_response(row) -> dict:
+	"""Same as Game.to_dict for a search row (Game columns plus initial_price, final_price and
+	calculated_score), built straight from the row. Dates come formatted from the database and
+	tags may already be a list."""
+	tags = row["tags"]
+	if not isinstance(tags, list):
+		tags = loads(tags) if tags else []
+	return {
+		"title": row["title"],
+		"steam_id": row["steam_id"],
+		"score": float(row["calculated_score"]),
+		"price": { "initial": row["initial_price"], "final": row["final_price"] } if row["initial_price"] is not None else None,
+		"steam_rating": row["steam_rating"],
+		"number_of_reviews": row["number_of_reviews"],
+		"is_released": bool(row["is_released"]),
+		"release_date": row["release_date_text"] if row["is_released"] else None,
+		"couch_players": row["couch_players"],
+		"lan_players": row["lan_players"],
+		"online_players": row["online_players"],
+		"cooptimus_url": row["cooptimus_url"],
+		"steam_url": row["steam_url"],
+		"header_image": row["header_image"],
+		"short_description": row["short_description"],
+		"tags": tags,
+	}
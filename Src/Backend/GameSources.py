@@ -0,0 +1,40 @@
+import hashlib
+import json
+from Game import Game
+
+# Game fields each source provides
+source_fields = {
+	"cooptimus": ("title", "couch_players", "lan_players", "online_players", "cooptimus_url", "steam_url"),
+	"steam": ("header_image", "short_description", "release_date", "is_released"),
+	"reviews": ("steam_rating", "number_of_reviews"),
+	"steamspy": ("tags",),
+}
+
+def fingerprint(game: Game, source: str) -> str:
+	values = [getattr(game, field) for field in source_fields[source]]
+	return hashlib.sha1(json.dumps(values, default=str).encode()).hexdigest()
+
+class GameSources:
+	"""Fingerprints of the data a game got from each source in the last scrape and in this one.
+	A source checked recently enough isn't fetched again, its fields are copied from the stored game instead.
+	The game only needs writing when a fingerprint differs from the stored one."""
+	def __init__(self, stored: dict[str, tuple[str, float]], stored_game: Game = None):
+		self.stored = stored						# Source -> (fingerprint, days since checked)
+		self.stored_game = stored_game
+		self.reused: set[str] = set()				# Sources not fetched this scrape
+
+	def reuse(self, game: Game, source: str, recheck_days: float) -> bool:
+		"""Copies the source's fields from the stored game if it was checked within recheck_days, returns whether it did"""
+		if self.stored_game is None or source not in self.stored or self.stored[source][1] > recheck_days:
+			return False
+		for field in source_fields[source]:
+			setattr(game, field, getattr(self.stored_game, field))
+		self.reused.add(source)
+		return True
+
+	def checked(self, game: Game) -> dict[str, str]:
+		"""Source -> fingerprint for the sources fetched this scrape"""
+		return { source: fingerprint(game, source) for source in source_fields if source not in self.reused }
+
+	def changed(self, checked: dict[str, str]) -> bool:
+		return self.stored_game is None or any(self.stored.get(source, (None,))[0] != value for source, value in checked.items())
@@ -1,7 +1,9 @@
 import json
 from Game import Game
 from Country import Country
-from dprint import dprint
+from Log import get_logger
+
+log = get_logger("GameStorage")
 
 # TODO Remove all this, since we're using DB
 def load_from_file(file_path):
@@ -10,15 +12,15 @@ def load_from_file(file_path):
 			data = json.load(f)
 		return data
 	except FileNotFoundError:
-		dprint(f"\n{file_path} not found. Starting with empty games list.")
+		log.warning("File not found, starting with empty games list", path=file_path)
 		return []
 	except Exception as e:
-		dprint(f"\nError loading games from {file_path}: {e}")
+		log.error("Error loading games", path=file_path, error=e)
 		return []
 
 def load_games_from_file(games_file="games.json"):
 	data = load_from_file(games_file)
-	dprint(f"\nLoaded {len(data)} games from {games_file}")
+	log.info("Loaded games", games=len(data), path=games_file)
 	return [Game.from_dict(item) for item in data]
 
 def load_countries_from_file(countries_file="countries.json"):
@@ -28,9 +30,9 @@ def load_countries_from_file(countries_file="countries.json"):
 def save_games_to_file(games, games_file="games.json"):
 	with open(games_file, "w", encoding="utf-8") as f:
 		json.dump([g.to_dict() for g in games], f, ensure_ascii=False, indent=2)
-	dprint(f"\nSaved {len(games)} games to {games_file}")
+	log.info("Saved games", games=len(games), path=games_file)
 
 def save_missing_to_file(games, games_file="missing.json"):
 	with open(games_file, "w", encoding="utf-8") as f:
 		json.dump(games, f, ensure_ascii=False, indent=2)
-	dprint(f"\nSaved {len(games)} games to {games_file}")
\ No newline at end of file
+	log.info("Saved games", games=len(games), path=games_file)
\ No newline at end of file
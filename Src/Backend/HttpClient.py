@@ -0,0 +1,88 @@
+import asyncio
+import json
+from typing import Awaitable, Callable
+import aiohttp
+from multidict import CIMultiDict
+from urllib.parse import urlsplit
+from RateLimiter import RateLimiter
+from ResponseCache import ResponseCache
+
+class HttpError(Exception):
+	def __init__(self, response):
+		super().__init__(f"{response.status} error for url: {response.url}")
+		self.response = response
+
+class HttpResponse:
+	def __init__(self, url: str, status: int, headers: dict, content: bytes):
+		self.url = url
+		self.status = status
+		self.headers = headers
+		self.content = content
+
+	def json(self):
+		return json.loads(self.content)
+
+	def raise_for_status(self):
+		if self.status >= 400:
+			raise HttpError(self)
+
+class HttpClient:
+	"""Async HTTP client sharing one connection pool between all scraper requests.
+	Every request waits for its host's rate limiter and concurrency cap, unless it can
+	be answered from the response cache.
+	Must be entered (async with) on the event loop that makes the requests."""
+	def __init__(self, rate_limiter: RateLimiter, cache: ResponseCache = None, timeout: float = 30,
+			transport: Callable[[str, dict, dict], Awaitable[HttpResponse]] = None):
+		self.rate_limiter = rate_limiter
+		self.cache = cache
+		self.timeout = timeout
+		self.transport = transport			# Sends (url, params, headers) instead of aiohttp when set, e.g. to a fake upstream
+		self.session: aiohttp.ClientSession = None
+		self.semaphores: dict[str, asyncio.Semaphore] = {}
+
+	async def __aenter__(self):
+		limits = list(self.rate_limiter.host_limits.values()) + [self.rate_limiter.default_limits]
+		connector = aiohttp.TCPConnector(limit=sum(l.concurrency for l in limits))
+		self.session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+		self.semaphores = {}
+		if self.cache:
+			await self.cache.open()
+		return self
+
+	async def __aexit__(self, *exc_info):
+		await self.session.close()
+		self.session = None
+		if self.cache:
+			await self.cache.close()
+
+	def _semaphore(self, host: str) -> asyncio.Semaphore:
+		if host not in self.semaphores:
+			self.semaphores[host] = asyncio.Semaphore(self.rate_limiter.limits(host).concurrency)
+		return self.semaphores[host]
+
+	async def get(self, url: str, params: dict = None) -> HttpResponse:
+		cached = await self.cache.get(url, params) if self.cache else None
+		if cached and cached.is_fresh():
+			await self.cache.touch(url, params)
+			return HttpResponse(url, cached.status, cached.headers, cached.content)
+
+		response = await self.send(url, params, cached.validators() if cached else {})
+		if cached and response.status == 304:
+			await self.cache.touch(url, params, revalidated=True)
+			return HttpResponse(url, cached.status, cached.headers, cached.content)
+		if self.cache and response.status == 200:
+			await self.cache.store(url, params, response.status, response.headers, response.content)
+		return response
+
+	async def send(self, url: str, params: dict, headers: dict) -> HttpResponse:
+		host = urlsplit(url).hostname
+		async with self._semaphore(host):
+			await self.rate_limiter.acquire(host)
+			if self.transport:
+				response = await self.transport(url, params, headers)
+			else:
+				async with self.session.get(url, params=params, headers=headers) as r:
+					content = await r.read()
+					response = HttpResponse(str(r.url), r.status, CIMultiDict(r.headers), content)
+		self.rate_limiter.on_response(host, response.status, response.headers)
+		return response
@@ -0,0 +1,179 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+log_level = os.environ.get("LOG_LEVEL", "INFO").upper()		# DEBUG shows per game lines, send SIGUSR1 to toggle it at runtime
+log_format = os.environ.get("LOG_FORMAT", "text")			# text (key=value fields) or json (one object per line)
+max_per_second = 20					# Records per second let through for each message below ERROR, the rest are counted as suppressed
+max_queued = 10000					# Records waiting to be written before new ones are dropped (and counted)
+
+class Logger:
+	"""Leveled, structured logging. Messages are constant text and the details go in fields,
+	e.g. log.info("Saved prices", games=12), so records can be rate limited per message and parsed.
+	Field values should not be changed after logging, they're formatted later on the writer thread."""
+	def __init__(self, name: str):
+		self.logger = logging.getLogger(f"coopgames.{name}")
+
+	def debug(self, message: str, **fields):
+		if self.logger.isEnabledFor(logging.DEBUG):
+			self.logger.debug(message, extra={ "fields": fields })
+
+	def info(self, message: str, **fields):
+		if self.logger.isEnabledFor(logging.INFO):
+			self.logger.info(message, extra={ "fields": fields })
+
+	def warning(self, message: str, **fields):
+		if self.logger.isEnabledFor(logging.WARNING):
+			self.logger.warning(message, extra={ "fields": fields })
+
+	def error(self, message: str, **fields):
+		if self.logger.isEnabledFor(logging.ERROR):
+			self.logger.error(message, extra={ "fields": fields })
+
+class RateLimitFilter(logging.Filter):
+	"""Lets through at most max_per_second records per message (and logger) below ERROR, in bursts of up to
+	that many. The number held back is added to the next record of the message that gets through."""
+	def __init__(self, max_per_second: float):
+		super().__init__()
+		self.max_per_second = max_per_second
+		self.buckets: dict[tuple, list] = {}		# (logger, message) -> [tokens, updated, suppressed]
+
+	def filter(self, record: logging.LogRecord) -> bool:
+		if record.levelno >= logging.ERROR:
+			return True
+		now = time.monotonic()
+		bucket = self.buckets.get((record.name, record.msg))
+		if bucket is None:
+			bucket = self.buckets[(record.name, record.msg)] = [self.max_per_second, now, 0]
+		bucket[0] = min(self.max_per_second, bucket[0] + (now - bucket[1]) * self.max_per_second)
+		bucket[1] = now
+		if bucket[0] < 1:
+			bucket[2] += 1
+			return False
+		bucket[0] -= 1
+		if bucket[2]:
+			record.fields = { **getattr(record, "fields", {}), "suppressed": bucket[2] }
+			bucket[2] = 0
+		return True
+
+class WriterListener(QueueListener):
+	def enqueue_sentinel(self):
+		# Waits for room rather than failing when the queue is full, so stopping writes everything queued
+		self.queue.put(self._sentinel)
+
+class BackgroundHandler(QueueHandler):
+	"""Queues records for a thread that writes them, so logging never waits on stdout (e.g. a slow Docker log driver).
+	The thread is started on first use in each process, so forked scraper workers get their own.
+	When the queue is full records are dropped rather than waited for, the count is added to the next one."""
+	def __init__(self, handler: logging.Handler, max_queued: int):
+		super().__init__(queue.Queue(max_queued))
+		self.handler = handler
+		self.listener: QueueListener = None
+		self.pid: int = None
+		self.dropped = 0
+		self.start_lock = threading.Lock()
+
+	def start(self):
+		with self.start_lock:
+			if self.pid == os.getpid():
+				return
+			self.queue = queue.Queue(self.queue.maxsize)
+			self.listener = WriterListener(self.queue, self.handler)
+			self.listener.start()
+			self.pid = os.getpid()
+			# Writes what's still queued when the process exits, except in multiprocessing children (see shutdown)
+			atexit.register(self.stop)
+
+	def stop(self):
+		"""Writes what's still queued and stops the thread. Logging after this starts it again."""
+		with self.start_lock:
+			if self.pid != os.getpid():
+				return
+			self.listener.stop()
+			self.pid = None
+
+	def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+		# Formatted on the writer thread instead
+		return record
+
+	def enqueue(self, record: logging.LogRecord):
+		if self.pid != os.getpid():
+			self.start()
+		if self.dropped:
+			record.fields = { **getattr(record, "fields", {}), "dropped": self.dropped }
+		try:
+			self.queue.put_nowait(record)
+			self.dropped = 0
+		except queue.Full:
+			self.dropped += 1
+
+def format_field(value) -> str:
+	text = str(value)
+	if not text or any(c in text for c in " =\"\n"):
+		return json.dumps(text)
+	return text
+
+class TextFormatter(logging.Formatter):
+	def format(self, record: logging.LogRecord) -> str:
+		fields = getattr(record, "fields", {})
+		line = f"{datetime.fromtimestamp(record.created).strftime('%y:%m:%d_%H:%M:%S')} {record.levelname:<7} {record.name.removeprefix('coopgames.')}: {record.getMessage()}"
+		if fields:
+			line += " " + " ".join(f"{key}={format_field(value)}" for key, value in fields.items())
+		return line
+
+class JsonFormatter(logging.Formatter):
+	def format(self, record: logging.LogRecord) -> str:
+		return json.dumps({
+			"time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+			"level": record.levelname,
+			"logger": record.name.removeprefix("coopgames."),
+			"message": record.getMessage(),
+			**getattr(record, "fields", {}),
+		}, default=str)
+
+def _configure() -> tuple[logging.Logger, BackgroundHandler]:
+	stream_handler = logging.StreamHandler(sys.stdout)
+	stream_handler.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+	handler = BackgroundHandler(stream_handler, max_queued)
+	handler.addFilter(RateLimitFilter(max_per_second))
+
+	root = logging.getLogger("coopgames")
+	root.setLevel(log_level)
+	root.addHandler(handler)
+	root.propagate = False
+	return root, handler
+
+_root, _handler = _configure()
+
+def get_logger(name: str) -> Logger:
+	return Logger(name)
+
+def set_level(level: str):
+	_root.setLevel(level.upper())
+
+def shutdown():
+	"""Writes the records still queued and stops the writer thread. Call before a process exits,
+	atexit does it too but multiprocessing children exit without running it."""
+	_handler.stop()
+
+def handle_level_signal():
+	"""Makes SIGUSR1 toggle between DEBUG and the configured level (docker kill -s USR1 <container>).
+	Call from the event loop of the main thread. The toggle runs as a loop callback instead of in the signal handler,
+	which could interrupt code holding the logging locks. Does nothing off the main thread or without SIGUSR1 (Windows)."""
+	if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+		return
+
+	def toggle():
+		normal_level = log_level if log_level != "DEBUG" else "INFO"
+		set_level(normal_level if _root.level == logging.DEBUG else "DEBUG")
+		get_logger("Log").info("Log level changed", log_level=logging.getLevelName(_root.level))
+	asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, toggle)
@@ -0,0 +1,174 @@
+import bisect
+import functools
+import inspect
+import math
+import time
+
+class Timer:
+	"""Observes the seconds spent in a with block"""
+	__slots__ = ("histogram", "labels", "start")
+
+	def __init__(self, histogram: "Histogram", labels: tuple):
+		self.histogram = histogram
+		self.labels = labels
+
+	def __enter__(self):
+		self.start = time.perf_counter()
+		return self
+
+	def __exit__(self, *exc_info):
+		self.histogram.observe(time.perf_counter() - self.start, self.labels)
+
+class Metric:
+	type = None
+
+	def __init__(self, name: str, help: str, labels: list[str] = None):
+		self.name = name
+		self.help = help
+		self.labels = labels or []
+		self.values: dict[tuple, object] = {}		# Label values -> value
+
+	def snapshot(self) -> dict:
+		return { "name": self.name, "type": self.type, "help": self.help, "labels": self.labels,
+			"samples": [[list(labels), value] for labels, value in self.values.items()] }
+
+class Counter(Metric):
+	type = "counter"
+
+	def inc(self, labels: tuple = (), amount: float = 1):
+		self.values[labels] = self.values.get(labels, 0) + amount
+
+class Gauge(Metric):
+	type = "gauge"
+
+	def set(self, value: float, labels: tuple = ()):
+		self.values[labels] = value
+
+class Histogram(Metric):
+	"""Counts observations per bucket. Buckets are kept non-cumulative and summed up when rendered,
+	so an observation is a bisect and two additions."""
+	type = "histogram"
+	default_buckets = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+	def __init__(self, name: str, help: str, labels: list[str] = None, buckets: list[float] = None):
+		super().__init__(name, help, labels)
+		self.buckets = buckets or self.default_buckets
+
+	def observe(self, value: float, labels: tuple = ()):
+		counts = self.values.get(labels)
+		if counts is None:
+			# Bucket counts (the last one for values above every bound) and the sum of the values
+			counts = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+		counts[0][bisect.bisect_left(self.buckets, value)] += 1
+		counts[1] += value
+
+	def time(self, labels: tuple = ()) -> Timer:
+		return Timer(self, labels)
+
+	def snapshot(self) -> dict:
+		snapshot = super().snapshot()
+		snapshot["buckets"] = self.buckets
+		return snapshot
+
+class Registry:
+	"""Metrics of this process. Snapshots are plain JSON, so other processes (scraper workers)
+	can hand theirs over to be rendered with the web server's."""
+	def __init__(self):
+		self.metrics: list[Metric] = []
+
+	def add(self, metric: Metric) -> Metric:
+		self.metrics.append(metric)
+		return metric
+
+	def snapshot(self) -> list[dict]:
+		return [metric.snapshot() for metric in self.metrics]
+
+def format_value(value: float) -> str:
+	if value == math.inf:
+		return "+Inf"
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+def format_labels(labels: dict) -> str:
+	if not labels:
+		return ""
+	escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in labels.values())
+	return "{" + ",".join(f"{name}=\"{value}\"" for name, value in zip(labels, escaped)) + "}"
+
+def render(sources: list[tuple[dict, list[dict]]]) -> str:
+	"""Prometheus text format of (extra labels, snapshot) pairs, e.g. one per process.
+	Samples of the same metric from different sources are grouped under one header."""
+	families: dict[str, list[tuple[dict, dict]]] = {}
+	for extra_labels, snapshot in sources:
+		for metric in snapshot:
+			families.setdefault(metric["name"], []).append((extra_labels, metric))
+
+	lines = []
+	for name, parts in families.items():
+		lines.append(f"# HELP {name} {parts[0][1]['help']}")
+		lines.append(f"# TYPE {name} {parts[0][1]['type']}")
+		for extra_labels, metric in parts:
+			for label_values, value in metric["samples"]:
+				labels = { **extra_labels, **dict(zip(metric["labels"], label_values)) }
+				if metric["type"] != "histogram":
+					lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+					continue
+				counts, total = value
+				cumulative = 0
+				for bound, count in zip(metric["buckets"] + [math.inf], counts):
+					cumulative += count
+					lines.append(f"{name}_bucket{format_labels({ **labels, 'le': format_value(bound) })} {cumulative}")
+				lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+				lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+	return "\n".join(lines) + "\n"
+
+def time_methods(cls, histogram: Histogram):
+	"""Observes the time of every public async method of the class, labeled by method name"""
+	for name, method in list(vars(cls).items()):
+		if name.startswith("_") or not inspect.iscoroutinefunction(method):
+			continue
+
+		def timed(method, labels):
+			@functools.wraps(method)
+			async def wrapper(*args, **kwargs):
+				with histogram.time(labels):
+					return await method(*args, **kwargs)
+			return wrapper
+		setattr(cls, name, timed(method, (name,)))
+
+class MetricsMiddleware:
+	"""ASGI middleware observing the latency of every HTTP request by route and status.
+	Labeled by the route's path template (e.g. /{full_path:path}), so the number of label values stays bounded."""
+	def __init__(self, app):
+		self.app = app
+
+	async def __call__(self, scope, receive, send):
+		if scope["type"] != "http":
+			return await self.app(scope, receive, send)
+
+		status = [500]
+		async def send_with_status(message):
+			if message["type"] == "http.response.start":
+				status[0] = message["status"]
+			await send(message)
+
+		start = time.perf_counter()
+		try:
+			await self.app(scope, receive, send_with_status)
+		finally:
+			route = scope.get("route")
+			http_request_seconds.observe(time.perf_counter() - start, (scope["method"], route.path if route else "other", str(status[0])))
+
+registry = Registry()
+
+http_request_seconds = registry.add(Histogram("http_request_seconds", "Time to handle HTTP requests to the web server", ["method", "route", "status"]))
+games_phase_seconds = registry.add(Histogram("games_phase_seconds",
+	"Time /games spends on searching (query), turning result rows into response entries (conversion) and writing the response (serialization). Cached searches skip query and conversion.", ["phase"]))
+games_cache = registry.add(Gauge("games_cache", "Query cache counters and size, see /games/cache", ["stat"]))
+database_seconds = registry.add(Histogram("database_seconds", "Time spent in each Database method, including waiting for a connection", ["method"]))
+scraper_request_seconds = registry.add(Histogram("scraper_request_seconds", "Time of each scraper request attempt, including rate limiting and cache lookups", ["endpoint"]))
+scraper_retries = registry.add(Counter("scraper_retries_total", "Scraper requests that failed and were tried again", ["endpoint"]))
+scraper_throttled = registry.add(Counter("scraper_throttled_total", "Scraper requests answered with 429 Too Many Requests", ["endpoint"]))
+scraper_failures = registry.add(Counter("scraper_failures_total", "Scraper requests that failed on every attempt", ["endpoint"]))
+pipeline_items = registry.add(Counter("pipeline_items_total", "Items handled by each game scraping pipeline stage", ["stage", "result"]))
+pipeline_busy_seconds = registry.add(Counter("pipeline_busy_seconds_total", "Seconds the workers of each game scraping pipeline stage spent handling items", ["stage"]))
+job_items_completed = registry.add(Counter("job_items_completed_total", "Scrape job items completed, per job stage", ["stage"]))
@@ -0,0 +1,14 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+-- Countries that Steam gives identical prices, sharing a single price request
+CREATE TABLE PriceRegion (
+    country_code TEXT PRIMARY KEY,
+    region_code TEXT NOT NULL, -- Country code that prices are requested with for the whole region
+    checked_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+DROP TABLE PriceRegion;
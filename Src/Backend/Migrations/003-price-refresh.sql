@@ -0,0 +1,24 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+-- When prices were last checked and last seen changing, per game and price region
+CREATE TABLE GamePriceRefresh (
+    steam_id INTEGER REFERENCES Game(steam_id) NOT NULL,
+    region_code TEXT NOT NULL,
+    checked_at DATETIME,
+    changed_at DATETIME,
+    on_sale BOOLEAN DEFAULT 0,
+    PRIMARY KEY (steam_id, region_code)
+);
+
+-- How often each game has been returned from /games
+CREATE TABLE GamePopularity (
+    steam_id INTEGER PRIMARY KEY REFERENCES Game(steam_id),
+    impressions INTEGER DEFAULT 0
+);
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+DROP TABLE GamePopularity;
+DROP TABLE GamePriceRefresh;
@@ -0,0 +1,36 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+CREATE TABLE ScrapeJob (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    full_scrape BOOLEAN NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running', -- running or completed. Failed jobs stay running so they are resumed.
+    last_error TEXT,
+    started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME
+);
+
+CREATE TABLE ScrapeJobStage (
+    job_id INTEGER REFERENCES ScrapeJob(id) NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running', -- running or completed
+    started_at DATETIME DEFAULT CURRENT_TIMESTAMP, -- When the stage was last started or resumed
+    done_at_start INTEGER DEFAULT 0, -- Items already done when the stage was last started or resumed
+    PRIMARY KEY (job_id, stage)
+);
+
+CREATE TABLE ScrapeJobItem (
+    job_id INTEGER REFERENCES ScrapeJob(id) NOT NULL,
+    stage TEXT NOT NULL,
+    item TEXT NOT NULL,
+    payload TEXT, -- JSON needed to redo the item after a restart
+    done BOOLEAN DEFAULT 0,
+    PRIMARY KEY (job_id, stage, item)
+);
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+DROP TABLE ScrapeJobItem;
+DROP TABLE ScrapeJobStage;
+DROP TABLE ScrapeJob;
@@ -0,0 +1,37 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+-- Tags of each game (lower case), so tag filters are index lookups instead of LIKE on Game.tags
+CREATE TABLE GameTag (
+    tag TEXT NOT NULL,
+    steam_id INTEGER REFERENCES Game(steam_id) NOT NULL,
+    PRIMARY KEY (tag, steam_id)
+) WITHOUT ROWID;
+
+CREATE INDEX GameTagSteamId ON GameTag(steam_id);
+
+INSERT OR IGNORE INTO GameTag (tag, steam_id)
+    SELECT lower(t.value), g.steam_id FROM Game g, json_each(g.tags) t;
+
+CREATE INDEX GameOnlinePlayers ON Game(online_players, is_released, number_of_reviews, release_date);
+CREATE INDEX GameCouchPlayers ON Game(couch_players, is_released, number_of_reviews, release_date);
+CREATE INDEX GameLanPlayers ON Game(lan_players, is_released, number_of_reviews, release_date);
+CREATE INDEX GameReleaseDate ON Game(release_date);
+CREATE INDEX GameNumberOfReviews ON Game(number_of_reviews);
+
+CREATE INDEX GamePriceCountry ON GamePrice(country_code, steam_id, initial_price, final_price);
+CREATE INDEX GameDelistedCountry ON GameDelisted(country_code, steam_id);
+
+ANALYZE;
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+DROP INDEX GameDelistedCountry;
+DROP INDEX GamePriceCountry;
+DROP INDEX GameNumberOfReviews;
+DROP INDEX GameReleaseDate;
+DROP INDEX GameLanPlayers;
+DROP INDEX GameCouchPlayers;
+DROP INDEX GameOnlinePlayers;
+DROP TABLE GameTag;
@@ -0,0 +1,16 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+-- Bumped in every transaction that changes games, prices or delistings,
+-- so readers holding a copy of the data know when it's outdated
+CREATE TABLE DataGeneration (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL
+);
+
+INSERT INTO DataGeneration (id, generation) VALUES (1, 1);
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+DROP TABLE DataGeneration;
@@ -0,0 +1,42 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+-- Everything /games filters and scores on, per country, so a search is a scan of one country's rows.
+-- Games delisted in a country have no row for it. Rebuilt by the scraper after each price scrape.
+CREATE TABLE GameSearch (
+    country_code TEXT NOT NULL,
+    steam_id INTEGER NOT NULL,
+    couch_players INTEGER,
+    lan_players INTEGER,
+    online_players INTEGER,
+    is_released BOOLEAN,
+    number_of_reviews INTEGER,
+    release_date TEXT,
+    initial_price INTEGER, -- NULL when there's no price in the country
+    final_price INTEGER,
+    discount REAL NOT NULL, -- 1 - final / initial price, 0 without a price
+    rating_squared REAL,
+    log_reviews REAL, -- log(number_of_reviews + 1) / log(100000)
+    PRIMARY KEY (country_code, steam_id)
+) WITHOUT ROWID;
+
+INSERT INTO GameSearch
+    SELECT
+        c.country_code, g.steam_id, g.couch_players, g.lan_players, g.online_players, g.is_released,
+        g.number_of_reviews, g.release_date, gp.initial_price, gp.final_price,
+        CASE
+            WHEN COALESCE(gp.initial_price, 0) > 0
+            THEN 1.0 - CAST(COALESCE(gp.final_price, 0) AS REAL) / gp.initial_price
+            ELSE 0
+        END,
+        g.steam_rating * g.steam_rating,
+        LOG(g.number_of_reviews + 1) / LOG(100000)
+    FROM (SELECT country_code FROM GamePrice UNION SELECT country_code FROM GameDelisted) c
+    CROSS JOIN Game g
+    LEFT JOIN GamePrice gp ON gp.steam_id = g.steam_id AND gp.country_code = c.country_code
+    WHERE NOT EXISTS (SELECT 1 FROM GameDelisted d WHERE d.steam_id = g.steam_id AND d.country_code = c.country_code);
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+DROP TABLE GameSearch;
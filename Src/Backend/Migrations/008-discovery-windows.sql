@@ -0,0 +1,15 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+-- Last results of each Co-Optimus release date window, so unchanged windows can be skipped
+CREATE TABLE DiscoveryWindow (
+    window_key TEXT PRIMARY KEY, -- e.g. 2020, 2020-05 or 2020-05-14
+    fingerprint TEXT NOT NULL, -- Hash of the games returned
+    games TEXT NOT NULL, -- JSON array of the games returned
+    checked_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+DROP TABLE DiscoveryWindow;
@@ -0,0 +1,17 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+-- Fingerprint of the data each source gave for a game in the last scrape that fetched it,
+-- so games whose sources are unchanged or were checked recently can be skipped
+CREATE TABLE GameSource (
+    steam_id INTEGER NOT NULL,
+    source TEXT NOT NULL, -- cooptimus, steam, reviews or steamspy
+    fingerprint TEXT NOT NULL, -- Hash of the game fields the source provides
+    checked_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (steam_id, source)
+) WITHOUT ROWID;
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+DROP TABLE GameSource;
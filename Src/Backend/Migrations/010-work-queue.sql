@@ -0,0 +1,30 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+-- Job items are claimed by scraper workers with a lease. Items whose lease ran out without
+-- being done (the worker died or the item failed) can be claimed by any worker again.
+ALTER TABLE ScrapeJobItem ADD COLUMN leased_by TEXT; -- Worker that claimed the item last
+ALTER TABLE ScrapeJobItem ADD COLUMN lease_expires_at REAL; -- Unix time, NULL if never claimed or released
+ALTER TABLE ScrapeJobItem ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0;
+
+-- Items of a job interrupted before this have no payload to work from, it's started over instead
+DELETE FROM ScrapeJobItem WHERE job_id IN (SELECT id FROM ScrapeJob WHERE status = 'running');
+DELETE FROM ScrapeJobStage WHERE job_id IN (SELECT id FROM ScrapeJob WHERE status = 'running');
+DELETE FROM ScrapeJob WHERE status = 'running';
+
+-- What each scraper worker is doing, updated every few seconds while it runs
+CREATE TABLE ScrapeWorker (
+    worker_id TEXT PRIMARY KEY, -- host:pid
+    job_id INTEGER,
+    state TEXT NOT NULL,
+    stats TEXT, -- JSON of pipeline metrics and skip counts
+    heartbeat_at REAL NOT NULL -- Unix time
+);
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+DROP TABLE ScrapeWorker;
+ALTER TABLE ScrapeJobItem DROP COLUMN attempts;
+ALTER TABLE ScrapeJobItem DROP COLUMN lease_expires_at;
+ALTER TABLE ScrapeJobItem DROP COLUMN leased_by;
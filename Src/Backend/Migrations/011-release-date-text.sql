@@ -0,0 +1,16 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+-- Release date as shown in /games responses (e.g. 05 Mar, 2021), formatted when the game is saved
+ALTER TABLE Game ADD COLUMN release_date_text TEXT;
+
+UPDATE Game SET release_date_text =
+    strftime('%d', release_date) || ' ' ||
+    substr('JanFebMarAprMayJunJulAugSepOctNovDec', CAST(strftime('%m', release_date) AS INTEGER) * 3 - 2, 3) || ', ' ||
+    strftime('%Y', release_date)
+WHERE release_date IS NOT NULL;
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+ALTER TABLE Game DROP COLUMN release_date_text;
@@ -0,0 +1,11 @@
+--------------------------------------------------------------------------------
+-- Up
+--------------------------------------------------------------------------------
+-- Times a stage of the job failed and left it to be resumed. Once it reaches ScrapeJob.max_job_attempts
+-- the job is given up with status failed. Jobs whose items failed every attempt complete with last_error set.
+ALTER TABLE ScrapeJob ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0;
+
+--------------------------------------------------------------------------------
+-- Down
+--------------------------------------------------------------------------------
+ALTER TABLE ScrapeJob DROP COLUMN attempts;
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from typing import AsyncIterable, Awaitable, Callable, Iterable
+from Metrics import pipeline_items, pipeline_busy_seconds
+from Log import get_logger
+
+log = get_logger("Pipeline")
+
+class StageMetrics:
+	def __init__(self, name: str, concurrency: int):
+		self.name = name
+		self.concurrency = concurrency
+		self.processed = 0
+		self.failed = 0
+		self.active = 0							# Items being handled right now
+		self.busy_seconds = 0.0					# Summed over all workers
+		self.started_at: float = None
+		self.finished_at: float = None
+		self.queue: asyncio.Queue = None
+
+	def to_dict(self) -> dict:
+		elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0
+		return {
+			"stage": self.name,
+			"concurrency": self.concurrency,
+			"processed": self.processed,
+			"failed": self.failed,
+			"active": self.active,
+			"queued": self.queue.qsize() if self.queue else 0,
+			"per_second": self.processed / elapsed if elapsed > 0 else 0,
+			"utilization": self.busy_seconds / (elapsed * self.concurrency) if elapsed > 0 else 0,
+		}
+
+class Stage:
+	def __init__(self, name: str, handler: Callable[[object], Awaitable[object]], concurrency: int = 1, queue_size: int = None, batch_size: int = None):
+		self.name = name
+		self.handler = handler						# Returns the item to pass on to the next stage, or None to drop it
+		self.concurrency = concurrency
+		self.batch_size = batch_size				# If set, the handler gets a list of up to this many items and returns the list to pass on
+		self.queue_size = queue_size or concurrency * (batch_size or 1) * 4
+		self.metrics = StageMetrics(name, concurrency)
+
+_done = object()
+
+class Pipeline:
+	"""Streams items through stages connected by bounded queues, each stage with its own number of workers.
+	A stage waits when the queue to the next one is full (backpressure), so a slow stage holds back
+	the ones before it instead of items piling up in memory.
+	Items that fail are dropped from the pipeline and the rest keep flowing. The errors are raised
+	together once everything else has finished."""
+	def __init__(self, stages: list[Stage]):
+		self.stages = stages
+		self.errors: list[Exception] = []
+
+	async def run(self, items: Iterable | AsyncIterable):
+		"""Items can come from an async iterable, which is only asked for more as the first stage takes them"""
+		queues = [asyncio.Queue(maxsize=stage.queue_size) for stage in self.stages]
+		self.errors = []
+
+		async def feed():
+			if isinstance(items, AsyncIterable):
+				async for item in items:
+					await queues[0].put(item)
+			else:
+				for item in items:
+					await queues[0].put(item)
+			await self._close(0, queues)
+
+		async def run_stage(index: int):
+			stage = self.stages[index]
+			stage.metrics.queue = queues[index]
+			stage.metrics.started_at = time.monotonic()
+			outbox = queues[index + 1] if index + 1 < len(queues) else None
+			await asyncio.gather(*[self._work(stage, queues[index], outbox) for _ in range(stage.concurrency)])
+			stage.metrics.finished_at = time.monotonic()
+			if outbox is not None:
+				await self._close(index + 1, queues)
+
+		await asyncio.gather(feed(), *[run_stage(index) for index in range(len(self.stages))])
+
+		if self.errors:
+			raise Exception(f"{len(self.errors)} items failed, first error: {self.errors[0]}") from self.errors[0]
+
+	async def _close(self, index: int, queues: list[asyncio.Queue]):
+		"""Tells every worker of a stage that nothing more is coming"""
+		for _ in range(self.stages[index].concurrency):
+			await queues[index].put(_done)
+
+	async def _work(self, stage: Stage, inbox: asyncio.Queue, outbox: asyncio.Queue):
+		metrics = stage.metrics
+		done = False
+		while not done:
+			item = await inbox.get()
+			if item is _done:
+				return
+
+			items = [item]
+			if stage.batch_size:
+				# A batch is whatever is already queued, waiting for a full one would stall the stages after it
+				while len(items) < stage.batch_size and not inbox.empty():
+					item = inbox.get_nowait()
+					if item is _done:
+						done = True
+						break
+					items.append(item)
+
+			metrics.active += len(items)
+			started_at = time.monotonic()
+			try:
+				results = await stage.handler(items) if stage.batch_size else [await stage.handler(item)]
+			except Exception as e:
+				metrics.failed += len(items)
+				pipeline_items.inc((stage.name, "failed"), len(items))
+				self.errors.append(e)
+				log.error("Pipeline stage failed", stage=stage.name, error=e)
+				continue
+			finally:
+				busy_seconds = time.monotonic() - started_at
+				metrics.active -= len(items)
+				metrics.busy_seconds += busy_seconds
+				pipeline_busy_seconds.inc((stage.name,), busy_seconds)
+
+			metrics.processed += len(items)
+			pipeline_items.inc((stage.name, "processed"), len(items))
+			if outbox is not None:
+				for result in results:
+					if result is not None:
+						await outbox.put(result)
+
+	def get_metrics(self) -> list[dict]:
+		return [stage.metrics.to_dict() for stage in self.stages]
@@ -0,0 +1,68 @@
+import math
+import threading
+import time
+from collections import Counter
+from Database import Database
+
+class ImpressionCounter:
+	"""Counts how often games are returned from /games, until they're flushed to the database"""
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.counts = Counter()
+
+	def add(self, steam_ids: list[int]):
+		with self.lock:
+			self.counts.update(steam_ids)
+
+	def drain(self) -> dict[int, int]:
+		with self.lock:
+			counts, self.counts = self.counts, Counter()
+		return dict(counts)
+
+	async def flush(self, database: Database):
+		impressions = self.drain()
+		if impressions:
+			await database.add_impressions(impressions)
+
+class PriceRefreshScheduler:
+	"""Picks which games' prices to refresh in a region given a fixed budget.
+	Priority is hours since the price was last checked, weighted up for games that are
+	likely to have changed: currently on sale, recently changed, recently released or
+	often shown to users. Games that have never been checked always come first."""
+	sale_weight = 2.0
+	recent_change_weight = 1.5
+	recent_change_days = 14
+	new_release_weight = 1.5
+	new_release_days = 90
+	popularity_weight = 1.5
+
+	def __init__(self, database: Database):
+		self.database = database
+
+	async def select(self, region_code: str, budget: int) -> list[int]:
+		candidates = await self.database.get_price_refresh_candidates(region_code)
+		max_impressions = max((row[5] for row in candidates), default=0)
+		now = time.time()
+
+		prioritized = sorted(candidates, key=lambda row: self.priority(now, max_impressions, *row), reverse=True)
+		return [row[0] for row in prioritized[:budget]]
+
+	def priority(self, now: float, max_impressions: int, steam_id: int, checked_at: int, changed_at: int, on_sale: bool, release_date: int, impressions: int) -> float:
+		if checked_at is None:
+			return math.inf
+
+		weight = 1.0
+		if on_sale:
+			weight += self.sale_weight
+		if changed_at is not None:
+			weight += self.recent_change_weight * math.exp(-days_between(changed_at, now) / self.recent_change_days)
+		if release_date is not None:
+			weight += self.new_release_weight * math.exp(-max(0, days_between(release_date, now)) / self.new_release_days)
+		if max_impressions > 0:
+			weight += self.popularity_weight * math.log1p(impressions) / math.log1p(max_impressions)
+
+		hours_since_checked = (now - checked_at) / 3600
+		return hours_since_checked * weight
+
+def days_between(timestamp: float, now: float) -> float:
+	return (now - timestamp) / 86400
@@ -0,0 +1,119 @@
+import asyncio
+import json
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from Database import Filters, Pagination, Scoring
+
+def ranking_key(filters: Filters, scoring: Scoring) -> tuple:
+	"""Normalized form of a search without its excluded games, equal for searches that always rank games the same.
+	Excluding games leaves the rest in the same order, so a position in the results stays valid when they change."""
+	return (
+		filters.country_code,
+		filters.min_supported_players,
+		filters.max_supported_players,
+		filters.player_type.lower() if filters.player_type.lower() in ("couch", "lan") else "online",
+		bool(filters.free_games),
+		bool(filters.unreleased_games),
+		filters.from_date,
+		filters.to_date,
+		max(filters.min_reviews, 0),
+		tuple(sorted({ tag.lower() for tag in filters.search_tags })),
+		float(scoring.rating_weight),
+		float(scoring.price_weight),
+		float(scoring.sale_weight),
+		float(scoring.number_of_reviews_weight),
+		float(scoring.high_price),
+	)
+
+def search_key(filters: Filters, scoring: Scoring) -> tuple:
+	"""Normalized form of a search, equal for searches that always give the same results"""
+	return ranking_key(filters, scoring) + (tuple(sorted(set(filters.excluded_steam_ids))),)
+
+def query_key(filters: Filters, scoring: Scoring, pagination: Pagination) -> tuple:
+	"""Normalized form of a search and the page of it, equal for queries that always give the same response"""
+	return search_key(filters, scoring) + (
+		pagination.limit,
+		pagination.offset,
+		pagination.after_score,
+		pagination.after_steam_id,
+	)
+
+def json_size(value) -> int:
+	return len(json.dumps(value, default=str))
+
+class QueryCache:
+	"""LRU cache of search results, tagged with the data generation they were computed at.
+	Everything cached is dropped when the generation changes (the scraper committed).
+	Concurrent misses on the same key share one computation instead of all running it."""
+	def __init__(self, max_entries: int = 2000, max_bytes: int = 32 * 1024 * 1024, size_of: Callable[[object], int] = json_size):
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.size_of = size_of
+		self.generation: int = None
+		self.entries: OrderedDict[tuple, tuple[object, int]] = OrderedDict()		# Key -> (value, size in bytes), least recently used first
+		self.in_flight: dict[tuple, asyncio.Task] = {}
+		self.total_bytes = 0
+		self.hits = 0
+		self.misses = 0
+		self.coalesced = 0			# Misses that waited for an identical computation already running
+		self.evictions = 0
+
+	def clear(self):
+		self.entries.clear()
+		self.total_bytes = 0
+
+	async def get(self, key: tuple, generation: int, compute: Callable[[], Awaitable[object]]) -> object:
+		if generation != self.generation:
+			self.clear()
+			self.generation = generation
+
+		if key in self.entries:
+			self.entries.move_to_end(key)
+			self.hits += 1
+			return self.entries[key][0]
+
+		flight_key = (generation, key)
+		if flight_key in self.in_flight:
+			self.coalesced += 1
+			return await asyncio.shield(self.in_flight[flight_key])
+
+		self.misses += 1
+		task = asyncio.ensure_future(compute())
+		self.in_flight[flight_key] = task
+		try:
+			# Shielded so a client disconnecting doesn't cancel it for the others waiting on it
+			value = await asyncio.shield(task)
+		finally:
+			if self.in_flight.get(flight_key) is task:
+				del self.in_flight[flight_key]
+
+		if generation == self.generation:
+			self.put(key, value)
+		return value
+
+	def put(self, key: tuple, value: object):
+		size = self.size_of(value)
+		if size > self.max_bytes:
+			return
+		if key in self.entries:
+			self.total_bytes -= self.entries.pop(key)[1]
+		self.entries[key] = (value, size)
+		self.total_bytes += size
+
+		while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+			_, (_, evicted_size) = self.entries.popitem(last=False)
+			self.total_bytes -= evicted_size
+			self.evictions += 1
+
+	def get_stats(self) -> dict:
+		lookups = self.hits + self.misses + self.coalesced
+		return {
+			"generation": self.generation,
+			"entries": len(self.entries),
+			"bytes": self.total_bytes,
+			"hits": self.hits,
+			"misses": self.misses,
+			"coalesced": self.coalesced,
+			"evictions": self.evictions,
+			"hit_rate": (self.hits + self.coalesced) / lookups if lookups else None,
+		}
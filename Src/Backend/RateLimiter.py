@@ -0,0 +1,105 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+class HostLimits:
+	def __init__(self, concurrency: int, rate: float, max_rate: float = None, burst: int = 1):
+		self.concurrency = concurrency			# Max requests in flight against the host
+		self.rate = rate						# Requests per second to start out with
+		self.max_rate = max_rate or rate		# Fastest the rate is allowed to grow to while the host keeps accepting
+		self.min_rate = rate / 16				# Slowest the rate is allowed to shrink to while the host keeps throttling
+		self.burst = burst						# Requests that may be sent back to back after being idle
+
+	def share(self, fraction: float) -> "HostLimits":
+		"""Limits for one of several processes that together should stay within these"""
+		return HostLimits(max(1, round(self.concurrency * fraction)), self.rate * fraction, self.max_rate * fraction, self.burst)
+
+class TokenBucket:
+	"""Adaptive token bucket. The rate is halved whenever the host throttles us (429/503)
+	and grows back a little for every successful request (AIMD)."""
+	throttle_factor = 0.5
+	recovery_steps = 50						# Successful requests needed to grow back from min to max rate
+
+	def __init__(self, limits: HostLimits):
+		self.limits = limits
+		self.rate = limits.rate
+		self.tokens = float(limits.burst)
+		self.updated = time.monotonic()
+		self.blocked_until = 0.0
+
+	def _refill(self, now: float):
+		self.tokens = min(self.limits.burst, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+
+	async def acquire(self):
+		now = time.monotonic()
+		self._refill(now)
+		# Reserve a token up front. Going negative puts us in line behind earlier reservations.
+		self.tokens -= 1
+		wait = max(-self.tokens / self.rate, self.blocked_until - now)
+		if wait > 0:
+			await asyncio.sleep(wait)
+		# Host may have asked us to back off while we were waiting
+		while (wait := self.blocked_until - time.monotonic()) > 0:
+			await asyncio.sleep(wait)
+
+	def on_success(self):
+		step = (self.limits.max_rate - self.limits.min_rate) / self.recovery_steps
+		self.rate = min(self.limits.max_rate, self.rate + step)
+
+	def on_throttled(self, retry_after: float = None):
+		self._refill(time.monotonic())
+		self.rate = max(self.limits.min_rate, self.rate * self.throttle_factor)
+		self.tokens = min(self.tokens, 0)
+		if retry_after:
+			self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+class RateLimiter:
+	"""Token buckets keyed by host, shared by every request made through the HttpClient.
+	Buckets are kept between scrapes so the learned rates carry over."""
+	throttle_statuses = { 429, 503 }
+
+	def __init__(self, host_limits: dict[str, HostLimits], default_limits: HostLimits):
+		self.host_limits = host_limits
+		self.default_limits = default_limits
+		self.buckets: dict[str, TokenBucket] = {}
+
+	def limits(self, host: str) -> HostLimits:
+		return self.host_limits.get(host, self.default_limits)
+
+	def bucket(self, host: str) -> TokenBucket:
+		if host not in self.buckets:
+			self.buckets[host] = TokenBucket(self.limits(host))
+		return self.buckets[host]
+
+	async def acquire(self, host: str):
+		await self.bucket(host).acquire()
+
+	def on_response(self, host: str, status: int, headers: dict):
+		bucket = self.bucket(host)
+		if status in self.throttle_statuses:
+			bucket.on_throttled(parse_retry_after(headers))
+		elif status < 400:
+			bucket.on_success()
+
+def parse_retry_after(headers: dict) -> float:
+	value = headers.get("Retry-After")
+	if not value:
+		return None
+	try:
+		return max(0.0, float(value))
+	except ValueError:
+		pass
+	try:
+		return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+	except (TypeError, ValueError):
+		return None
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: float = None) -> float:
+	"""Capped exponential backoff with full jitter. Retry-After from the host wins if it's longer."""
+	delay = random.uniform(0, min(cap, base * 2 ** attempt))
+	if retry_after:
+		delay = max(delay, min(cap, retry_after))
+	return delay
@@ -0,0 +1,127 @@
+import time
+import aiosqlite
+from urllib.parse import urlencode
+from multidict import CIMultiDict
+
+class CacheRule:
+	def __init__(self, url_prefix: str, ttl: float, params: dict = None):
+		self.url_prefix = url_prefix
+		self.ttl = ttl							# Seconds a response is used without asking the server
+		self.params = params or {}				# Params that must be present (with value, or None for any value)
+
+	def matches(self, url: str, params: dict) -> bool:
+		if not url.startswith(self.url_prefix):
+			return False
+		return all(key in params and (value is None or str(params[key]) == str(value)) for key, value in self.params.items())
+
+class CachedResponse:
+	def __init__(self, status: int, headers: CIMultiDict, content: bytes, fetched_at: float, ttl: float):
+		self.status = status
+		self.headers = headers
+		self.content = content
+		self.fetched_at = fetched_at
+		self.ttl = ttl
+
+	def is_fresh(self) -> bool:
+		return time.time() - self.fetched_at < self.ttl
+
+	def validators(self) -> dict:
+		"""Headers for asking the server if the response has changed since we fetched it"""
+		validators = {}
+		if "ETag" in self.headers:
+			validators["If-None-Match"] = self.headers["ETag"]
+		if "Last-Modified" in self.headers:
+			validators["If-Modified-Since"] = self.headers["Last-Modified"]
+		return validators
+
+class ResponseCache:
+	"""On-disk cache of successful GET responses, keyed by URL and params.
+	Responses are used as-is within their rule's TTL, then revalidated with ETag/Last-Modified
+	where the server supports it. Least recently used responses are evicted when the file holds more than max_bytes.
+	The file can be shared by several scraper processes, so its size is read from SQLite rather than counted.
+	Requests not matching any rule are not cached."""
+	def __init__(self, rules: list[CacheRule], db_path: str = "http_cache.db", max_bytes: int = 256 * 1024 * 1024):
+		self.rules = rules
+		self.db_path = db_path
+		self.max_bytes = max_bytes
+		self.conn: aiosqlite.Connection = None
+
+	async def open(self):
+		self.conn = await aiosqlite.connect(self.db_path)
+		await self.conn.executescript("""
+			PRAGMA journal_mode = WAL;
+			PRAGMA synchronous = NORMAL;
+			CREATE TABLE IF NOT EXISTS Response (
+				key TEXT PRIMARY KEY,
+				status INTEGER NOT NULL,
+				etag TEXT,
+				last_modified TEXT,
+				content BLOB NOT NULL,
+				size INTEGER NOT NULL,
+				fetched_at REAL NOT NULL,
+				accessed_at REAL NOT NULL
+			);
+			CREATE INDEX IF NOT EXISTS ResponseAccessed ON Response(accessed_at);
+		""")
+
+	async def close(self):
+		await self.conn.close()
+		self.conn = None
+
+	def rule(self, url: str, params: dict) -> CacheRule:
+		return next((rule for rule in self.rules if rule.matches(url, params or {})), None)
+
+	def key(self, url: str, params: dict) -> str:
+		return f"{url}?{urlencode(sorted((params or {}).items()))}"
+
+	async def get(self, url: str, params: dict) -> CachedResponse:
+		rule = self.rule(url, params)
+		if rule is None:
+			return None
+		async with self.conn.execute("""
+				SELECT status, etag, last_modified, content, fetched_at FROM Response WHERE key = ?
+			""", (self.key(url, params),)) as cursor:
+			row = await cursor.fetchone()
+		if row is None:
+			return None
+
+		headers = CIMultiDict()
+		if row[1]:
+			headers["ETag"] = row[1]
+		if row[2]:
+			headers["Last-Modified"] = row[2]
+		return CachedResponse(row[0], headers, row[3], row[4], rule.ttl)
+
+	async def touch(self, url: str, params: dict, revalidated: bool = False):
+		"""Marks a cached response as used, and as fresh again if the server says it's unchanged"""
+		now = time.time()
+		if revalidated:
+			await self.conn.execute("UPDATE Response SET accessed_at = ?, fetched_at = ? WHERE key = ?", (now, now, self.key(url, params)))
+		else:
+			await self.conn.execute("UPDATE Response SET accessed_at = ? WHERE key = ?", (now, self.key(url, params)))
+		await self.conn.commit()
+
+	async def store(self, url: str, params: dict, status: int, headers: CIMultiDict, content: bytes):
+		if self.rule(url, params) is None:
+			return
+		key = self.key(url, params)
+		now = time.time()
+		await self.conn.execute("""
+				INSERT OR REPLACE INTO Response (key, status, etag, last_modified, content, size, fetched_at, accessed_at)
+				VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+			""", (key, status, headers.get("ETag"), headers.get("Last-Modified"), content, len(content), now, now))
+		await self.evict()
+		await self.conn.commit()
+
+	async def get_size(self) -> int:
+		"""Bytes of the file in use (pages that aren't free), including what other processes have written"""
+		async with self.conn.execute("""
+				SELECT (page_count - freelist_count) * page_size FROM pragma_page_count, pragma_freelist_count, pragma_page_size
+			""") as cursor:
+			return (await cursor.fetchone())[0]
+
+	async def evict(self):
+		while await self.get_size() > self.max_bytes:
+			cursor = await self.conn.execute("DELETE FROM Response WHERE key IN (SELECT key FROM Response ORDER BY accessed_at LIMIT 100)")
+			if not cursor.rowcount:
+				return
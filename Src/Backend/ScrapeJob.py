@@ -0,0 +1,97 @@
+import json
+from Database import Database
+from Log import get_logger
+
+log = get_logger("ScrapeJob")
+
+class ScrapeJob:
+	"""A scrape whose progress is stored in the database per stage and item,
+	so it can be resumed where it stopped after a failure or restart.
+	Any number of workers can work on a job at once. They claim its items with a lease that they
+	keep extending while they're alive, so items of a worker that died are claimed by others."""
+	lease_seconds = 60
+	max_attempts = 3						# Times an item is claimed before the stage is completed without it
+	max_job_attempts = 3					# Times a job is resumed after a stage failed before it's given up as failed
+
+	def __init__(self, database: Database, job_id: int, full_scrape: bool, worker_id: str, attempts: int = 0):
+		self.database = database
+		self.id = job_id
+		self.full_scrape = full_scrape
+		self.worker_id = worker_id
+		self.attempts = attempts				# Failed attempts at the job when this worker resumed it
+
+	@classmethod
+	async def start_or_resume(cls, database: Database, full_scrape: bool, worker_id: str):
+		"""Returns the running job, or starts a new one if there is none"""
+		running = await database.get_scrape_job("running")
+		if not running:
+			await database.create_scrape_job(full_scrape)
+			# Another worker may have started one first, either way it's the running job now
+			running = await database.get_scrape_job("running")
+		else:
+			log.info("Resuming scrape job", job=running[0])
+		return cls(database, running[0], bool(running[1]), worker_id, running[4])
+
+	@classmethod
+	async def resume(cls, database: Database, worker_id: str):
+		"""Returns the running job, or None"""
+		running = await database.get_scrape_job("running")
+		return cls(database, running[0], bool(running[1]), worker_id, running[4]) if running else None
+
+	async def start_stage(self, stage: str) -> bool:
+		"""Returns False if the stage was already completed"""
+		return await self.database.start_job_stage(self.id, stage)
+
+	async def complete_stage(self, stage: str):
+		await self.database.complete_job_stage(self.id, stage)
+
+	async def add_items(self, stage: str, items: dict[str, object]):
+		await self.database.add_job_items(self.id, stage, { item: json.dumps(payload) for item, payload in items.items() })
+
+	async def get_items(self, stage: str) -> list[tuple]:
+		"""Returns (item, payload, done) for every item in the stage"""
+		return [(item, json.loads(payload), bool(done)) for item, payload, done in await self.database.get_job_items(self.id, stage)]
+
+	async def claim_items(self, stage: str, count: int) -> list[tuple]:
+		"""Leases up to count items of the stage to this worker, returns their (item, payload)"""
+		rows = await self.database.claim_job_items(self.id, stage, self.worker_id, count, self.lease_seconds, self.max_attempts)
+		return [(item, json.loads(payload)) for item, payload in rows]
+
+	async def release_items(self, stage: str):
+		await self.database.release_job_items(self.id, stage, self.worker_id)
+
+	async def get_item_counts(self, stage: str) -> tuple[int, int, int]:
+		"""Returns the number of (unfinished, leased, claimable) items in the stage"""
+		return await self.database.get_job_item_counts(self.id, stage, self.max_attempts)
+
+	async def complete_items(self, stage: str, items: list[str]):
+		await self.database.complete_job_items(self.id, stage, items)
+
+	async def finish(self, error: str = None, resume: bool = False) -> str:
+		"""Completes the job, with the error if some items failed. If a stage failed (resume) the job is instead left
+		running to be resumed, until that has happened max_job_attempts times and it's given up. Returns the job's status,
+		which is whatever another worker left it at if it already finished the job."""
+		if not resume:
+			await self.database.finish_scrape_job(self.id, "completed", error)
+			return "completed"
+		status, attempts = await self.database.fail_scrape_job_attempt(self.id, error, self.attempts)
+		self.attempts = attempts
+		if status != "running" or attempts < self.max_job_attempts:
+			return status
+		await self.database.finish_scrape_job(self.id, "failed", error)
+		return "failed"
+
+	async def get_progress(self) -> list[dict]:
+		progress = []
+		for stage, status, total, done, done_at_start, seconds in await self.database.get_job_progress(self.id):
+			# Only count what was done since the stage was (re)started, for an honest rate
+			rate = (done - done_at_start) / seconds if seconds > 0 else 0
+			eta = 0 if status == "completed" else ((total - done) / rate if rate > 0 else None)
+			progress.append({
+				"stage": stage,
+				"status": status,
+				"done": done,
+				"total": total,
+				"eta_seconds": eta,
+			})
+		return progress
@@ -0,0 +1,61 @@
+import time
+from Database import Database
+from ScrapeJob import ScrapeJob
+
+class ScrapeStatus:
+	"""What the scraper workers are doing, as seen from the web server.
+	Read from the database on refresh() and kept in between, so /games doesn't have to ask every request."""
+	worker_timeout_seconds = 60			# Workers not heard from in this long are considered gone
+
+	def __init__(self, database: Database, scrape_interval_hours: int):
+		self.database = database
+		self.scrape_interval_hours = scrape_interval_hours
+		self.last_scrape_time: float = None
+		self.running_job: tuple = None
+		self.workers: list[tuple] = []
+
+	async def refresh(self):
+		last_job = await self.database.get_scrape_job("completed")
+		self.last_scrape_time = last_job[3] if last_job else None
+		self.running_job = await self.database.get_scrape_job("running")
+		self.workers = await self.database.get_scrape_workers(self.worker_timeout_seconds)
+
+	def job_workers(self) -> list[tuple]:
+		"""Workers working on the running job"""
+		if self.running_job is None:
+			return []
+		return [worker for worker in self.workers if worker[1] == self.running_job[0]]
+
+	def get_status(self):
+		workers = self.job_workers()
+		return {
+			"scraping_in_progress": len(workers) > 0,
+			"scraping_state": "; ".join(state for _, _, state, _ in workers) or "None",
+			"last_scrape_hours_ago": self.last_scrape_hours_ago(),
+			"scrape_interval_hours": self.scrape_interval_hours,
+			"workers": len(self.workers),
+		}
+
+	def last_scrape_hours_ago(self):
+		if self.last_scrape_time is None:
+			return None
+		return (time.time() - self.last_scrape_time) / 3600 # Convert to hours
+
+	async def get_progress(self):
+		if self.running_job is None:
+			return None
+		job = ScrapeJob(self.database, self.running_job[0], bool(self.running_job[1]), None)
+		return {
+			"job_id": job.id,
+			"full_scrape": job.full_scrape,
+			"stages": await job.get_progress(),
+			"workers": [{ "worker_id": worker_id, "state": state, **{ key: value for key, value in (stats or {}).items() if key != "metrics" } }
+				for worker_id, _, state, stats in self.job_workers()],
+		}
+
+	async def start_scrape(self) -> bool:
+		"""Queues a scrape for the workers to pick up, returns False if one is already running"""
+		full_scrape = not await self.database.has_completed_full_scrape()
+		job_id = await self.database.create_scrape_job(full_scrape)
+		await self.refresh()
+		return job_id is not None
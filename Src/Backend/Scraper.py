@@ -1,116 +1,216 @@
-import requests
-import time
-from bs4 import BeautifulSoup
+import asyncio
+import os
+import aiohttp
 from datetime import datetime
 from Database import Database, GameCountryData
 from Game import Game
 from Price import Price
 from GameStorage import load_countries_from_file
-from dprint import dprint
+from PriceScheduler import PriceRefreshScheduler
+from ScrapeJob import ScrapeJob
+from AsyncUtils import gather_all
+from BatchWriter import BatchWriter
+from CoopParser import parse_games
+from Discovery import CoopDiscovery, DiscoveryWindow
+from GameSources import GameSources
+from Pipeline import Pipeline, Stage
+from HttpClient import HttpClient, HttpError
+from Metrics import scraper_request_seconds, scraper_retries, scraper_throttled, scraper_failures
+from RateLimiter import RateLimiter, HostLimits, backoff_delay, parse_retry_after
+from ResponseCache import ResponseCache, CacheRule
+from Log import get_logger
+
+log = get_logger("Scraper")
+
+def hours(count: float) -> float:
+	return count * 3600
+
+def endpoint_name(url: str, params: dict) -> str:
+	"""Which API a request is to, as labeled in metrics"""
+	if url.startswith("https://api.co-optimus.com/"):
+		return "cooptimus"
+	if url.startswith("https://store.steampowered.com/api/appdetails"):
+		return "steam-prices" if (params or {}).get("filters") == "price_overview" else "steam-appdetails"
+	if url.startswith("https://store.steampowered.com/appreviews/"):
+		return "steam-reviews"
+	if url.startswith("https://steamspy.com/"):
+		return "steamspy"
+	return "other"
 
 class Scraper:
-	def __init__(self, database: Database):
+	def __init__(self, database: Database, rate_share: float = 1):
+		"""rate_share is the part of the request rate limits this scraper gets, when several processes scrape at once"""
 		self.database = database
+		self.price_scheduler = PriceRefreshScheduler(database)
+		self.discovery = CoopDiscovery(database, self.get_cooptimus_games_data)
 		self.scraping_state = "None"
+		self.pipeline: Pipeline = None		# Pipeline of the last game scrape, kept for its metrics
 		self.scraping_start_year = 1988
-		self.scraping_end_year = datetime.now().year 
 		self.country_codes = load_countries_from_file("../Countries.json")
-		self.steam_delay = 2  # Delay between Steam API requests
+		self.retry_base_delay = 2		# Seconds to back off after the first failed request, doubled for each retry
+		self.retry_max_delay = 120		# Longest we back off between two retries
+		self.price_region_recheck_days = 7	# How often we check which countries share prices
+		self.price_refresh_budget = 2000	# Games to refresh prices for in each price region per scrape
+		self.price_batch_size = 200			# Games per price request
+		self.price_batches_at_once = 8		# Price batches claimed and fetched together
+		self.discovery_years_at_once = 8	# Co-Optimus release years claimed and searched together
+		self.app_details_batch_size = 50	# Games to get store data for per appdetails request
+		self.app_details_batching = True	# Turned off for the rest of a scrape if Steam doesn't answer batches
+		self.source_recheck_days = { "steam": 7, "reviews": 1, "steamspy": 7 }	# How long a source's data for a game is used before fetching it again
+		self.skipped: dict[str, int] = {}	# Requests and writes left out in the last game scrape because nothing was due or changed
+		self.http = HttpClient(RateLimiter({
+			"api.co-optimus.com": HostLimits(concurrency=2, rate=2, max_rate=4).share(rate_share),
+			"store.steampowered.com": HostLimits(concurrency=4, rate=0.7, max_rate=2).share(rate_share),
+			"steamspy.com": HostLimits(concurrency=2, rate=1, max_rate=2).share(rate_share),
+		}, default_limits=HostLimits(concurrency=2, rate=1).share(rate_share)), ResponseCache([
+			# Prices are only cached long enough to resume an interrupted scrape without refetching them
+			CacheRule("https://store.steampowered.com/api/appdetails", ttl=hours(1), params={"filters": "price_overview"}),
+			CacheRule("https://store.steampowered.com/api/appdetails", ttl=hours(24)),
+			CacheRule("https://store.steampowered.com/appreviews/", ttl=hours(12)),
+			CacheRule("https://steamspy.com/api.php", ttl=hours(24)),
+			CacheRule("https://api.co-optimus.com/games.php", ttl=hours(6)),
+		# Next to the games database, so it's kept on the same volume across redeploys
+		], db_path=os.path.join(os.path.dirname(database.db_path), "http_cache.db")))
 
-	async def scrape_games(self, last_scrape_time: float):
-		self.last_scrape_time = last_scrape_time
-		self.scraping_state = "Finding games"
-		games = self.fetch_coop_games()
-		games = self.remove_duplicates(games)
+	def get_stages(self) -> list[tuple]:
+		"""(name, stage it needs, seed, work) for each stage of a scrape job, in order.
+		A stage is skipped if the stage it needs failed. seed adds the stage's items and can run in several
+		workers at once. work claims items of the stage and handles them until there are none left to claim."""
+		return [
+			("discovery", None, self.seed_discovery, self.discover_games),
+			("games", "discovery", None, self.scrape_games),
+			# New and changed games are searchable with SQL right away, not only once prices are scraped
+			("games-search-table", "games", self.single_item("games-search-table"), self.build_search_table("games-search-table")),
+			("price-selection", None, self.single_item("price-selection"), self.select_prices),
+			("prices", "price-selection", None, self.scrape_prices),
+			("search-table", "prices", self.single_item("search-table"), self.build_search_table("search-table")),
+		]
 
-		count = len(games)
-		i = 1
-		for game in games:
-			self.scraping_state = f"Getting Steam data ({i}/{count})"
-			if not self.validate_steam_id(game):
-				count -= 1
-				continue
-			self.add_steam_data(game)
-			if game.is_removed:
-				count -= 1
-				continue
-			self.add_rating(game)
-			self.add_tags(game)
-			i += 1
-			await self.database.save_game(game)
-			# We're hitting steam twice with both details and ratings
-			time.sleep(self.steam_delay * 2)
-
-		return await self.database.get_total_games_count(), count
-	
-	def fetch_coop_games(self):
-		all_games = []
-		if self.last_scrape_time is None:
-			all_games = self.fetch_all_coop_games()
+	def single_item(self, stage: str):
+		"""Seed for stages that are done in one go by whichever worker claims it"""
+		return lambda job: job.add_items(stage, { stage: None })
+
+	async def seed_discovery(self, job: ScrapeJob):
+		if job.full_scrape:
+			years = range(self.scraping_start_year, datetime.now().year + 1)
 		else:
-			all_games = self.fetch_updated_since_last()
+			years = [datetime.now().year]
+		await job.add_items("discovery", { str(year): { "year": year } for year in years })
 
-		games = []
-		for game in all_games:
-			try:
-				if not game.find("steam"):
-					continue
-
-				g = Game()
-				g.title = game.find("title").text
-				g.steam_id = game.find("steam").text
-				g.couch_players = int(game.find("local").text or 0)
-				g.lan_players = int(game.find("lan").text or 0)
-				g.online_players = int(game.find("online").text or 0)
-				g.cooptimus_url = game.find("url").text
-				g.steam_url = f"https://store.steampowered.com/app/{g.steam_id}"
-
-				games.append(g)
-			except Exception as e:
-				dprint(f"Failed to parse game entry: {e}")
-		
-		return games
-	
-	def fetch_all_coop_games(self):
-		all_games = []
-		for year in range(self.scraping_start_year, self.scraping_end_year + 1):
-			yearly = self.get_cooptimus_games_data({"releaseyear": year})
-			dprint(f"Year: {year}, Games found: {len(yearly)}")
-			if len(yearly) == 40:
-				dprint("Found more than 40 games, scraping by month...")
-				yearly.extend(self.fetch_all_coop_games_for_year(year))
-			
-			dprint(f"Total games for {year}: {len(yearly)}")
-			all_games.extend(yearly)
+	async def discover_games(self, job: ScrapeJob):
+		async with self.http:
+			while items := await job.claim_items("discovery", self.discovery_years_at_once):
+				self.scraping_state = "Finding games"
+				records = await self.discovery.discover([DiscoveryWindow(payload["year"]) for _, payload in items])
+				# Games found more than once are only added the first time
+				await job.add_items("games", { record["steam"]: record for record in reversed(records) if record["steam"] })
+				await job.complete_items("discovery", [item for item, _ in items])
 
-		dprint(f"Found {len(all_games)} games")
-		return all_games
-	
-	def fetch_all_coop_games_for_year(self, year):
-		yearly = []
-		for month in range(1, 13):
-			monthly = self.get_cooptimus_games_data({"releaseyear": year, "releasemonth": month})
-			dprint(f"Year: {year}, Month: {month}, Games found: {len(monthly)}")
-			yearly.extend(monthly)
-		return yearly
+	async def scrape_games(self, job: ScrapeJob):
+		async with self.http:
+			self.games_done = 0
+			self.games_saved = 0
+			self.skipped = { "steam": 0, "reviews": 0, "steamspy": 0, "unchanged": 0 }
+			self.app_details_batching = True
+			async with BatchWriter(self.database) as writer:
+				# Each source gets as many workers as its host allows concurrent requests
+				limits = self.http.rate_limiter.limits
+				self.pipeline = Pipeline([
+					Stage("steam", self.steam_stage, concurrency=limits("store.steampowered.com").concurrency, batch_size=self.app_details_batch_size),
+					Stage("reviews", self.reviews_stage, concurrency=limits("store.steampowered.com").concurrency),
+					Stage("steamspy", self.steamspy_stage, concurrency=limits("steamspy.com").concurrency),
+					Stage("save", lambda entry: self.save_stage(entry, job, writer)),
+				])
+				await self.pipeline.run(self.claim_games(job))
+
+		log.info("Scraped games", saved=self.games_saved, done=self.games_done, skipped_store_pages=self.skipped["steam"],
+			skipped_reviews=self.skipped["reviews"], skipped_tags=self.skipped["steamspy"], skipped_unchanged=self.skipped["unchanged"])
+
+	async def claim_games(self, job: ScrapeJob):
+		"""Claims games as the pipeline takes them. Items are (job item, game), the game's steam_id can be changed by validate_steam_id."""
+		while items := await job.claim_items("games", self.app_details_batch_size):
+			for item, record in items:
+				yield (item, self.record_to_game(record))
+
+	# Games that are removed or ignored pass through the remaining stages untouched,
+	# so the save stage can mark them as done in the job
+
+	async def steam_stage(self, entries: list[tuple[str, Game]]) -> list[tuple[str, Game, GameSources]]:
+		games = [game for _, game in entries if self.validate_steam_id(game)]
+		sources = await self.get_game_sources(games)
+
+		due = []
+		for game in games:
+			if sources[game].reuse(game, "steam", self.source_recheck_days["steam"]):
+				game.is_removed = False
+				self.skipped["steam"] += 1
+			else:
+				due.append(game)
+		await self.add_steam_data(due)
+		return [(item, game, sources.get(game)) for item, game in entries]
+
+	async def reviews_stage(self, entry: tuple[str, Game, GameSources]) -> tuple[str, Game, GameSources]:
+		_, game, sources = entry
+		if not game.is_removed:
+			if sources.reuse(game, "reviews", self.source_recheck_days["reviews"]):
+				self.skipped["reviews"] += 1
+			else:
+				await self.add_rating(game)
+		return entry
+
+	async def steamspy_stage(self, entry: tuple[str, Game, GameSources]) -> tuple[str, Game, GameSources]:
+		_, game, sources = entry
+		if not game.is_removed:
+			if sources.reuse(game, "steamspy", self.source_recheck_days["steamspy"]):
+				self.skipped["steamspy"] += 1
+			else:
+				await self.add_tags(game)
+		return entry
+
+	async def save_stage(self, entry: tuple[str, Game, GameSources], job: ScrapeJob, writer: BatchWriter):
+		item, game, sources = entry
+		if not game.is_removed:
+			checked = sources.checked(game)
+			if sources.changed(checked):
+				await writer.add_game(game)
+				self.games_saved += 1
+			else:
+				self.skipped["unchanged"] += 1
+			await writer.add_game_sources(int(game.steam_id), checked)
+		await writer.complete_job_items(job, "games", [item])
+		self.games_done += 1
+		self.scraping_state = f"Getting Steam data ({self.games_done} games done)"
+
+	async def get_game_sources(self, games: list[Game]) -> dict[Game, GameSources]:
+		steam_ids = [int(game.steam_id) for game in games]
+		stored_sources = await self.database.get_game_sources(steam_ids)
+		stored_games = await self.database.get_games_by_steam_ids(steam_ids)
+		return { game: GameSources(stored_sources.get(int(game.steam_id), {}), stored_games.get(int(game.steam_id))) for game in games }
+
+	def get_skip_stats(self) -> dict[str, int]:
+		return self.skipped
+
+	def get_pipeline_metrics(self) -> list[dict]:
+		return self.pipeline.get_metrics() if self.pipeline else None
 	
-	def fetch_updated_since_last(self):
-		#return self.get_cooptimus_games_data({"updatedsince": self.last_scrape_time.strftime('%Y-%m-%dT%H:%M:%S')})
-		return self.fetch_all_coop_games_for_year(datetime.now().year)
+	def record_to_game(self, record: dict) -> Game:
+		g = Game()
+		g.title = record["title"]
+		g.steam_id = record["steam"]
+		g.couch_players = record["local"]
+		g.lan_players = record["lan"]
+		g.online_players = record["online"]
+		g.cooptimus_url = record["url"]
+		g.steam_url = f"https://store.steampowered.com/app/{g.steam_id}"
+		return g
 
-	def get_cooptimus_games_data(self, params):
+	async def get_cooptimus_games_data(self, params) -> list[dict]:
 		url = "https://api.co-optimus.com/games.php"
-		params["search"] = "true"
-		params["systemName"] = "pc"
-		r = self.try_request(url, params=params)
+		params = { **params, "search": "true", "systemName": "pc" }
+		r = await self.try_request(url, params=params)
 
-		root = BeautifulSoup(r.content, "lxml-xml")
-		return root.find_all("game")
+		return parse_games(r.content)
 
-	def remove_duplicates(self, games):
-		seen_steam_ids = set()
-		return list(filter(lambda game: game.steam_id not in seen_steam_ids and not seen_steam_ids.add(game.steam_id), games))
-	
 	def validate_steam_id(self, game):
 		if game.steam_id in self.invalid_steam_id_mappings:
 			game.steam_id = self.invalid_steam_id_mappings[game.steam_id]
@@ -119,18 +219,46 @@ class Scraper:
 			return False
 		return True
 
-	def add_steam_data(self, game):
+	async def add_steam_data(self, games: list[Game]):
+		"""Adds store data to the games, asking Steam for several games per request"""
+		if not games:
+			return
+		responses = {}
+		if self.app_details_batching and len(games) > 1:
+			responses = await self.fetch_app_details_batch([game.steam_id for game in games])
+
+		# Games the batch didn't answer for are fetched one by one
+		missing = [game for game in games if str(game.steam_id) not in responses]
+		for game, response in zip(missing, await gather_all(*[self.fetch_app_details([game.steam_id]) for game in missing])):
+			responses.update(response)
+
+		for game in games:
+			self.set_steam_data(game, responses.get(str(game.steam_id)))
+
+	async def fetch_app_details(self, steam_ids: list[str], retries: int = 8) -> dict:
 		url = f"https://store.steampowered.com/api/appdetails"
-		params = {"appids": game.steam_id}
-		response = self.try_request(url, params)
+		params = {"appids": ",".join(str(steam_id) for steam_id in steam_ids), "filters": "basic,release_date"}
+		return (await self.try_request(url, params=params, retries=retries)).json() or {}
+
+	async def fetch_app_details_batch(self, steam_ids: list[str]) -> dict:
+		try:
+			# Only tried once, the games are fetched one by one if it fails
+			responses = await self.fetch_app_details(steam_ids, retries=1)
+		except Exception as e:
+			log.warning("Batched appdetails request failed", error=e)
+			responses = {}
+		if not any(isinstance(response, dict) and "success" in response for response in responses.values()):
+			# Steam answers nothing for batches it doesn't support, no point in sending more of them
+			log.warning("Steam didn't answer a batched appdetails request, getting store data one game at a time")
+			self.app_details_batching = False
+		return responses
 
-		game_response = {}
+	def set_steam_data(self, game: Game, game_response: dict):
 		try:
-			game_response = response.json()[str(game.steam_id)]
 			if not game_response["success"]:
 				raise Exception("Removed game")
 		except:
-			dprint(f"{game.title} ({game.steam_id}), no data found")
+			log.debug("No store data found", title=game.title, steam_id=game.steam_id)
 			game.is_removed = True
 			return
 
@@ -147,10 +275,10 @@ class Scraper:
 		except:
 			game.is_released = False
 
-	def add_rating(self, game):
+	async def add_rating(self, game):
 		url = f"https://store.steampowered.com/appreviews/{game.steam_id}"
 		params = {"json": 1, "num_per_page": 1, "language": "all", "purchase_type": "all"}
-		r = self.try_request(url, params=params).json()
+		r = (await self.try_request(url, params=params)).json()
 		q = r.get("query_summary", {})
 		game.number_of_reviews = q.get("total_reviews")
 		if game.number_of_reviews == 0:
@@ -158,70 +286,151 @@ class Scraper:
 		else:
 			game.steam_rating = q.get("total_positive") / game.number_of_reviews
 
-	def add_tags(self, game):
+	async def add_tags(self, game):
 		"""Add tags to game via SteamSpy"""
 		params = {"request": "appdetails", "appid": game.steam_id}
-		response = self.try_request(f"https://steamspy.com/api.php", params=params)
+		response = await self.try_request(f"https://steamspy.com/api.php", params=params)
 		data = response.json()
 		try:
 			game.tags = list(data.get("tags", {}).keys())
 		except:
 			return
 
-	async def scrape_country_data(self):
-		steam_ids = await self.database.get_all_steam_ids()
-		batch_size = 200
-
-		dprint(f"Fetching country data (prices, delistings) for {len(steam_ids)} games")
-		for i in range(0, len(steam_ids), batch_size):
-			self.scraping_state = f"Getting prices ({i}/{len(steam_ids)})"
-			batch = steam_ids[i:i+batch_size]
-			steam_ids_str = ",".join([str(steam_id) for steam_id in batch])
-
-			countries_data: dict[int, GameCountryData] = {}
-			for steam_id in batch:
-				countries_data[steam_id] = GameCountryData()
-
-			for country in self.country_codes:
-				url = f"https://store.steampowered.com/api/appdetails"
-				params = {"appids": steam_ids_str, "cc": country.code, "filters": "price_overview"}
-				game_data = self.try_request(url, params=params).json()
-
-				for steam_id in batch:
-					game_response = game_data[str(steam_id)]
-					
-					if not game_response.get("success", False):
-						# If we can't get the game at all, assume it's delisted in this country
-						countries_data[steam_id].delist(country.code)
-						continue
-					
-					# TODO remove, never happens
-					if "data" not in game_response:
-						dprint(f"!!!!! No data field for steam id {steam_id} in {country.code}")
-						continue
-
-					data = game_response["data"]
-
-					if "price_overview" not in data:
-						continue
-
-					price_info = data["price_overview"]
-					price = Price(price_info["initial"], price_info["final"])
-					countries_data[steam_id].add_price(country.code, price)
-
-				time.sleep(self.steam_delay)
-
-			await self.database.save_country_data(countries_data)
+	async def select_prices(self, job: ScrapeJob):
+		"""Groups countries into price regions and picks the games to refresh prices for in each.
+		Done once per job, so a resumed job finishes the same batches."""
+		async with self.http:
+			for item, _ in await job.claim_items("price-selection", 1):
+				regions = await self.get_price_regions((await self.database.get_all_steam_ids())[:self.price_batch_size])
+				region_members: dict[str, list[str]] = {}
+				for country_code, region_code in regions.items():
+					region_members.setdefault(region_code, []).append(country_code)
+
+				items = {}
+				for region_code, country_codes in region_members.items():
+					steam_ids = await self.price_scheduler.select(region_code, self.price_refresh_budget)
+					for i in range(0, len(steam_ids), self.price_batch_size):
+						items[f"{region_code}:{i}"] = { "region_code": region_code, "country_codes": country_codes, "steam_ids": steam_ids[i:i+self.price_batch_size] }
+				await job.add_items("prices", items)
+				await job.complete_items("price-selection", [item])
+				log.info("Fetching country data (prices, delistings)", batches=len(items), price_regions=len(region_members))
+
+	async def scrape_prices(self, job: ScrapeJob):
+		async with self.http:
+			async with BatchWriter(self.database, flush_size=2000) as writer:
+				done = 0
+				while work := await job.claim_items("prices", self.price_batches_at_once):
+					self.scraping_state = f"Getting prices ({done} batches done)"
+					results = await gather_all(*[self.fetch_region_prices(batch["steam_ids"], batch["region_code"]) for _, batch in work])
+
+					for (item, batch), game_data in zip(work, results):
+						region_code = batch["region_code"]
+						countries_data = { steam_id: GameCountryData() for steam_id in batch["steam_ids"] }
+						self.add_country_data(batch["steam_ids"], game_data, batch["country_codes"], countries_data)
+						await writer.add_price_refresh(region_code, { steam_id: countries_data[steam_id].prices.get(region_code) for steam_id in batch["steam_ids"] })
+						await writer.add_country_data(countries_data)
+						await writer.complete_job_items(job, "prices", [item])
+					done += len(work)
+
+	def build_search_table(self, stage: str):
+		"""Work for stages that rebuild GameSearch, done by whichever worker claims it"""
+		async def work(job: ScrapeJob):
+			for item, _ in await job.claim_items(stage, 1):
+				self.scraping_state = "Building search table"
+				await self.database.rebuild_search_table([country.code for country in self.country_codes])
+				await job.complete_items(stage, [item])
+		return work
+
+	async def get_price_regions(self, probe_steam_ids: list[int]) -> dict[str, str]:
+		"""Maps each country code to the country code whose prices it shares.
+		Countries get grouped when they return identical currency, prices and availability for
+		the probe games. Grouping is kept for price_region_recheck_days before probing again."""
+		regions = await self.database.get_price_regions(self.price_region_recheck_days)
+		country_codes = [country.code for country in self.country_codes]
+		if all(code in regions for code in country_codes) or not probe_steam_ids:
+			return regions or { code: code for code in country_codes }
+
+		self.scraping_state = "Finding price regions"
+		results = await gather_all(*[self.fetch_region_prices(probe_steam_ids, code) for code in country_codes])
+
+		groups: dict[tuple, list[str]] = {}
+		for code, game_data in zip(country_codes, results):
+			groups.setdefault(self.price_fingerprint(game_data), []).append(code)
+
+		regions = {}
+		for codes in groups.values():
+			for code in codes:
+				regions[code] = min(codes)
+
+		await self.database.save_price_regions(regions)
+		log.info("Found price regions", price_regions=len(groups), countries=len(country_codes))
+		return regions
+
+	def price_fingerprint(self, game_data: dict) -> tuple:
+		fingerprint = []
+		for steam_id, game_response in sorted(game_data.items()):
+			data = game_response.get("data")
+			price_info = data.get("price_overview") if isinstance(data, dict) else None
+			if price_info:
+				fingerprint.append((steam_id, price_info["currency"], price_info["initial"], price_info["final"]))
+			else:
+				fingerprint.append((steam_id, game_response.get("success", False)))
+		return tuple(fingerprint)
+
+	async def fetch_region_prices(self, batch: list[int], region_code: str) -> dict:
+		url = f"https://store.steampowered.com/api/appdetails"
+		steam_ids_str = ",".join([str(steam_id) for steam_id in batch])
+		params = {"appids": steam_ids_str, "cc": region_code, "filters": "price_overview"}
+		return (await self.try_request(url, params=params)).json()
+
+	def add_country_data(self, batch: list[int], game_data: dict, country_codes: list[str], countries_data: dict[int, GameCountryData]):
+		for steam_id in batch:
+			game_response = game_data[str(steam_id)]
+			for country_code in country_codes:
+				countries_data[steam_id].check(country_code)
+			
+			if not game_response.get("success", False):
+				# If we can't get the game at all, assume it's delisted in this country
+				for country_code in country_codes:
+					countries_data[steam_id].delist(country_code)
+				continue
+			
+			# TODO remove, never happens
+			if "data" not in game_response:
+				log.warning("No data field in price response", steam_id=steam_id, country_code=country_codes[0])
+				continue
+
+			data = game_response["data"]
+
+			if "price_overview" not in data:
+				continue
+
+			price_info = data["price_overview"]
+			price = Price(price_info["initial"], price_info["final"])
+			for country_code in country_codes:
+				countries_data[steam_id].add_price(country_code, price)
 		
-	def try_request(self, url, params=None, retries=15):
+	async def try_request(self, url, params=None, retries=8):
+		endpoint = (endpoint_name(url, params),)
 		for attempt in range(retries):
+			retry_after = None
 			try:
-				response = requests.get(url, params=params)
+				with scraper_request_seconds.time(endpoint):
+					response = await self.http.get(url, params=params)
 				response.raise_for_status()
 				return response
-			except requests.RequestException as e:
-				dprint(f"Request failed ({attempt + 1}/{retries}): {e}")
-				time.sleep(self.steam_delay ** attempt)
+			except HttpError as e:
+				if e.response.status == 429:
+					scraper_throttled.inc(endpoint)
+				retry_after = parse_retry_after(e.response.headers)
+				log.warning("Request failed", attempt=attempt + 1, retries=retries, error=e)
+			except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+				log.warning("Request failed", attempt=attempt + 1, retries=retries, url=url, error=repr(e))
+			if attempt + 1 == retries:
+				break
+			scraper_retries.inc(endpoint)
+			await asyncio.sleep(backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay, retry_after))
+		scraper_failures.inc(endpoint)
 		raise Exception(f"Failed to fetch {url} after {retries} attempts")
 
 	invalid_steam_id_mappings = {
@@ -0,0 +1,152 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+from Database import Database
+from Scraper import Scraper
+from ScrapeJob import ScrapeJob
+from Metrics import registry
+from Log import get_logger, handle_level_signal, shutdown as shutdown_log
+from Settings import database_path, scrape_interval_hours
+
+log = get_logger("ScraperWorker")
+
+class ScraperWorker:
+	"""Runs scrape jobs outside the web server. Any number of workers, in any number of processes or
+	containers, can run against the same database. They work on the same job by claiming its items
+	from the database, so the job goes faster with more of them and survives any of them dying."""
+	poll_seconds = 30					# How often an idle worker checks for a job
+	heartbeat_seconds = 10				# How often the worker's status is saved and its leases extended
+	error_backoff_seconds = 3600		# Lets their servers relax a while after a job failed
+
+	def __init__(self, database: Database, rate_share: float = 1):
+		self.database = database
+		self.scraper = Scraper(database, rate_share)
+		self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+		self.job: ScrapeJob = None
+
+	async def run(self):
+		handle_level_signal()
+		await self.database.init_database()
+		heartbeat_task = asyncio.create_task(self.heartbeat())
+		try:
+			while True:
+				job = await self.next_job()
+				if job is None:
+					await asyncio.sleep(self.poll_seconds)
+				elif await self.run_job(job):
+					await asyncio.sleep(self.error_backoff_seconds)
+		finally:
+			heartbeat_task.cancel()
+			await self.database.close()
+
+	async def next_job(self) -> ScrapeJob:
+		"""Returns the running job, or a new one if it's time to scrape"""
+		job = await ScrapeJob.resume(self.database, self.worker_id)
+		if job is None and await self.is_scrape_due():
+			full_scrape = not await self.database.has_completed_full_scrape()
+			job = await ScrapeJob.start_or_resume(self.database, full_scrape, self.worker_id)
+		return job
+
+	async def is_scrape_due(self) -> bool:
+		# Jobs that were given up wait for the next interval too, so a failing scrape isn't retried all the time
+		finished_at = await self.database.get_last_scrape_finished_at()
+		return finished_at is None or time.time() - finished_at >= scrape_interval_hours * 3600
+
+	async def run_job(self, job: ScrapeJob) -> list[str]:
+		self.job = job
+		log.info("Working on scrape job", worker=self.worker_id, job=job.id)
+		errors = []
+		failed = set()
+		try:
+			for stage, needs, seed, work in self.scraper.get_stages():
+				if needs in failed:
+					continue
+				try:
+					failed_items = await self.run_stage(job, stage, seed, work)
+				except Exception as e:
+					failed.add(stage)
+					errors.append(f"Error in stage {stage}: {e}")
+					log.error("Stage failed", stage=stage, error=e)
+					continue
+				if failed_items:
+					errors.append(f"{failed_items} items in stage {stage} failed {ScrapeJob.max_attempts} times")
+					log.warning("Stage completed without items that failed every attempt", stage=stage, items=failed_items)
+		finally:
+			self.job = None
+			self.scraper.scraping_state = "None"
+
+		status = await job.finish("\n".join(errors) if errors else None, resume=bool(failed))
+		if status == "running":
+			log.warning("Scrape job failed, see errors above. It will be resumed on the next attempt.", job=job.id)
+		elif status == "failed":
+			log.error("Scrape job failed too many times, giving up on it until the next scrape", job=job.id, attempts=ScrapeJob.max_job_attempts)
+		else:
+			log.info("Scrape job completed", job=job.id, stages_with_failed_items=len(errors), total_games=await self.database.get_total_games_count())
+		return errors
+
+	async def run_stage(self, job: ScrapeJob, stage: str, seed, work) -> int:
+		"""Works on the stage until every item is done or out of attempts and completes it.
+		Returns the number of items that failed every attempt."""
+		if not await job.start_stage(stage):
+			return 0
+		if seed:
+			await seed(job)
+
+		while True:
+			try:
+				await work(job)
+			except Exception as e:
+				log.error("Stage work failed, releasing its items", stage=stage, error=e)
+			# Items still leased to this worker weren't finished (failed, or their write was lost), and the heartbeat
+			# would keep renewing their leases. Released, they're claimed again until they run out of attempts.
+			await job.release_items(stage)
+
+			unfinished, leased, claimable = await job.get_item_counts(stage)
+			if not leased and not claimable:
+				# Whatever is left failed every attempt, one bad game shouldn't hold up the rest of the job
+				break
+			if not claimable:
+				# Other workers are still working on the rest
+				await asyncio.sleep(self.poll_seconds)
+		await job.complete_stage(stage)
+		return unfinished
+
+	async def heartbeat(self):
+		while True:
+			try:
+				stats = {
+					"pipeline": self.scraper.get_pipeline_metrics(),
+					"skipped": self.scraper.get_skip_stats(),
+					"metrics": registry.snapshot(),		# Served by the web server's /metrics
+				}
+				await self.database.save_scrape_worker(self.worker_id, self.job.id if self.job else None,
+					self.scraper.scraping_state, stats, ScrapeJob.lease_seconds)
+			except Exception as e:
+				log.error("Worker heartbeat failed", error=e)
+			await asyncio.sleep(self.heartbeat_seconds)
+
+def run_worker(rate_share: float):
+	try:
+		asyncio.run(ScraperWorker(Database(database_path), rate_share).run())
+	finally:
+		shutdown_log()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Runs scrape jobs against the games database. Start as many as you like.")
+	parser.add_argument("--processes", type=int, default=1, help="Worker processes to start")
+	parser.add_argument("--total-processes", type=int, default=None,
+		help="Worker processes scraping in all, including ones in other containers. Request rate limits are split between them. Defaults to --processes.")
+	args = parser.parse_args()
+	rate_share = 1 / (args.total_processes or args.processes)
+
+	if args.processes == 1:
+		run_worker(rate_share)
+	else:
+		processes = [multiprocessing.Process(target=run_worker, args=(rate_share,)) for _ in range(args.processes)]
+		for process in processes:
+			process.start()
+		for process in processes:
+			process.join()
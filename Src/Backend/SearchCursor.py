@@ -0,0 +1,31 @@
+import base64
+import hashlib
+import json
+
+class SearchCursor:
+	"""Opaque position in /games results, given to the client with each page so the next page
+	continues after the last game instead of counting past every game before it with an offset"""
+	def __init__(self, search_hash: str, count_hash: str, generation: int, total_count: int, score: float, steam_id: int):
+		self.search_hash = search_hash				# Search the cursor was made for without its excluded games, see hash_search
+		self.count_hash = count_hash				# Search including excluded games the total count was counted for
+		self.generation = generation				# Data generation the total count was counted at
+		self.total_count = total_count
+		self.score = score							# Score and steam_id of the last game on the page
+		self.steam_id = steam_id
+
+	def encode(self) -> str:
+		data = json.dumps([self.search_hash, self.count_hash, self.generation, self.total_count, self.score, self.steam_id], separators=(',', ':'))
+		return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+	@classmethod
+	def decode(cls, text: str) -> "SearchCursor":
+		"""Raises ValueError if the text isn't a cursor"""
+		try:
+			data = json.loads(base64.urlsafe_b64decode(text + '=' * (-len(text) % 4)))
+			search_hash, count_hash, generation, total_count, score, steam_id = data
+			return cls(str(search_hash), str(count_hash), int(generation), int(total_count), float(score), int(steam_id))
+		except (ValueError, TypeError) as e:
+			raise ValueError(f"Invalid cursor: {e}")
+
+def hash_search(search_key: tuple) -> str:
+	return hashlib.blake2b(repr(search_key).encode(), digest_size=8).hexdigest()
@@ -0,0 +1,231 @@
+import asyncio
+import math
+import time
+from Database import Database, Filters, Pagination, Scoring
+from Game import game_response, loads
+from Metrics import games_phase_seconds
+from Log import get_logger
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+log = get_logger("SearchEngine")
+
+class CountryColumns:
+	"""Prices and delistings in one country, aligned with the rows of a SearchSnapshot"""
+	def __init__(self, snapshot: "SearchSnapshot", prices: list[tuple], delisted: list[int]):
+		count = len(snapshot.rows)
+		self.initial_price = np.full(count, np.nan)			# NaN where the game has no price in the country
+		self.final_price = np.full(count, np.nan)
+		self.delisted = np.zeros(count, dtype=bool)
+
+		if prices:
+			steam_ids, initial, final = zip(*prices)
+			rows, found = snapshot.rows_of(steam_ids)
+			self.initial_price[rows] = np.array(initial, dtype=float)[found]
+			self.final_price[rows] = np.array(final, dtype=float)[found]
+		if delisted:
+			rows, _ = snapshot.rows_of(delisted)
+			self.delisted[rows] = True
+
+		# Missing prices count as 0 in the score, like COALESCE in the SQL query
+		self.initial_or_zero = np.nan_to_num(self.initial_price)
+		self.final_or_zero = np.nan_to_num(self.final_price)
+
+class SearchSnapshot:
+	"""Column arrays of every game at one data generation, ordered by steam_id.
+	Never changed after it's built, apart from countries being added as they're first searched."""
+	def __init__(self, generation: int, rows: list, tags: list[tuple]):
+		self.generation = generation
+		self.rows = [dict(zip(row.keys(), row)) for row in rows]
+		count = len(self.rows)
+		for row in self.rows:
+			# Parsed once here instead of for every response
+			row["tags"] = loads(row["tags"]) if row["tags"] else []
+
+		def column(name, dtype):
+			return np.fromiter((row[name] or 0 for row in self.rows), dtype=dtype, count=count)
+
+		self.steam_ids = column("steam_id", np.int64)
+		self.rating_squared = column("steam_rating", float) ** 2
+		self.number_of_reviews = column("number_of_reviews", np.int64)
+		self.log_reviews = np.log1p(self.number_of_reviews) / math.log(100000)
+		self.is_released = column("is_released", bool)
+		self.players = {
+			"couch": column("couch_players", np.int32),
+			"lan": column("lan_players", np.int32),
+			"online": column("online_players", np.int32),
+		}
+		# NaT where the date is unknown, which fails every date filter like NULL does in SQL
+		self.release_date = np.array([row["release_date"] or "NaT" for row in self.rows], dtype="datetime64[D]")
+
+		tag_rows: dict[str, list[int]] = {}
+		if tags:
+			steam_ids, names = zip(*tags)
+			rows, found = self.rows_of(steam_ids)
+			for row, name in zip(rows, np.array(names, dtype=object)[found]):
+				tag_rows.setdefault(name, []).append(row)
+		self.tags = { name: np.array(rows, dtype=np.int64) for name, rows in tag_rows.items() }
+
+		self.countries: dict[str, asyncio.Future] = {}
+
+	def rows_of(self, steam_ids) -> tuple:
+		"""Returns (rows, found) where rows are the row indices of the steam_ids that are in the snapshot"""
+		steam_ids = np.asarray(steam_ids, dtype=np.int64)
+		rows = np.searchsorted(self.steam_ids, steam_ids)
+		found = rows < len(self.steam_ids)
+		found[found] = self.steam_ids[rows[found]] == steam_ids[found]
+		return rows[found], found
+
+	def tag_mask(self, tag: str):
+		mask = np.zeros(len(self.rows), dtype=bool)
+		if tag in self.tags:
+			mask[self.tags[tag]] = True
+		return mask
+
+	def filter(self, country: CountryColumns, filters: Filters):
+		mask = ~country.delisted
+
+		players = self.players.get(filters.player_type.lower(), self.players["online"])
+		mask &= (players >= filters.min_supported_players) & (players <= filters.max_supported_players)
+
+		if not filters.free_games:
+			mask &= country.final_price > 0
+		if not filters.unreleased_games:
+			mask &= self.is_released
+		if filters.min_reviews > 0:
+			mask &= self.number_of_reviews >= filters.min_reviews
+		for tag in { tag.lower() for tag in filters.search_tags }:
+			mask &= self.tag_mask(tag)
+		if filters.excluded_steam_ids:
+			excluded, _ = self.rows_of(filters.excluded_steam_ids)
+			mask[excluded] = False
+		if filters.from_date:
+			mask &= self.release_date >= np.datetime64(filters.from_date, "D")
+		if filters.to_date:
+			mask &= self.release_date <= np.datetime64(filters.to_date, "D")
+		return mask
+
+	def score(self, country: CountryColumns, rows, scoring: Scoring):
+		"""Same expression as the SQL query in Database.get_games, for the given rows"""
+		initial = country.initial_or_zero[rows]
+		final = country.final_or_zero[rows]
+		with np.errstate(divide="ignore", invalid="ignore"):
+			sale = 1.0 - np.divide(final, initial, out=np.ones_like(final), where=initial > 0)
+			return (self.rating_squared[rows] * scoring.rating_weight
+				- (final / 100.0 / scoring.high_price) * scoring.price_weight
+				+ sale * scoring.sale_weight
+				+ self.log_reviews[rows] * scoring.number_of_reviews_weight)
+
+	def search(self, country: CountryColumns, filters: Filters, scoring: Scoring, pagination: Pagination) -> tuple[list[dict], int]:
+		"""Returns (rows of the page in the same form as the SQL query's, total number of matching games)"""
+		rows = np.flatnonzero(self.filter(country, filters))
+		total_count = len(rows)
+
+		scores = self.score(country, rows, scoring)
+		# NULL scores (e.g. high_price 0) sort last in SQL
+		keys = np.where(np.isnan(scores), -np.inf, scores)
+		if pagination.after_score is not None:
+			after = (keys < pagination.after_score) | ((keys == pagination.after_score) & (self.steam_ids[rows] > pagination.after_steam_id))
+			rows, scores, keys = rows[after], scores[after], keys[after]
+
+		end = min(pagination.offset + pagination.limit, len(rows))
+		if pagination.offset >= end:
+			return [], total_count
+		if end < len(rows):
+			# Only the games scoring at least as high as the last one on the page need sorting,
+			# ties included so the order doesn't depend on which of them argpartition picked
+			threshold = keys[np.argpartition(-keys, end - 1)[end - 1]]
+			candidates = np.flatnonzero(keys >= threshold)
+		else:
+			candidates = np.arange(len(rows))
+		# Highest score first, ties by steam_id
+		order = candidates[np.lexsort((self.steam_ids[rows[candidates]], -keys[candidates]))]
+		page = order[pagination.offset:end]
+
+		page_rows = []
+		for index in page:
+			row = rows[index]
+			initial = country.initial_price[row]
+			page_rows.append({
+				**self.rows[row],
+				"initial_price": None if np.isnan(initial) else int(initial),
+				"final_price": int(country.final_or_zero[row]),
+				"calculated_score": scores[index],
+			})
+		return page_rows, total_count
+
+class SearchEngine:
+	"""Answers /games from NumPy column arrays of all games held in memory, instead of running
+	the score expression in SQL for every matching row.
+	The database is checked for new data at most every check_seconds, so while the scraper commits a batch
+	every few seconds the games are reloaded (and the query cache cleared) at most that often. New data is
+	loaded in the background and searches are answered from the previous snapshot until it's swapped in whole."""
+	check_seconds = 60
+
+	def __init__(self, database: Database):
+		self.database = database
+		self.snapshot: SearchSnapshot = None
+		self.reload_task: asyncio.Task = None
+		self.next_check_at = 0.0
+
+	@staticmethod
+	def is_available() -> bool:
+		return np is not None
+
+	async def get_games(self, filters: Filters, scoring: Scoring, pagination: Pagination) -> tuple[list[dict], int]:
+		with games_phase_seconds.time(("query",)):
+			# The request already checked for new data in get_generation
+			snapshot = self.snapshot or await self.get_snapshot()
+			country = await self.get_country(snapshot, filters.country_code)
+			rows, total_count = snapshot.search(country, filters, scoring, pagination)
+		with games_phase_seconds.time(("conversion",)):
+			return [game_response(row) for row in rows], total_count
+
+	async def get_generation(self) -> int:
+		"""Generation of the data searches are currently answered from. Called once per request, before get_games."""
+		return (await self.get_snapshot()).generation
+
+	async def get_snapshot(self) -> SearchSnapshot:
+		if self.snapshot is None:
+			self.next_check_at = time.monotonic() + self.check_seconds
+			await self.reload()
+		elif time.monotonic() >= self.next_check_at:
+			self.next_check_at = time.monotonic() + self.check_seconds
+			if await self.database.get_generation() != self.snapshot.generation:
+				self.reload()
+		return self.snapshot
+
+	def reload(self) -> asyncio.Task:
+		"""Starts loading a new snapshot, unless one is already loading"""
+		if self.reload_task is None or self.reload_task.done():
+			self.reload_task = asyncio.create_task(self._load())
+			self.reload_task.add_done_callback(self._reload_done)
+		return self.reload_task
+
+	async def _load(self):
+		generation, rows, tags = await self.database.get_search_games()
+		# Building the arrays is CPU work, so it's kept off the event loop
+		self.snapshot = await asyncio.to_thread(SearchSnapshot, generation, rows, tags)
+		log.info("Loaded games into the search engine", games=len(rows), generation=generation)
+
+	def _reload_done(self, task: asyncio.Task):
+		if not task.cancelled() and task.exception():
+			log.error("Unable to load the search engine", error=task.exception())
+
+	async def get_country(self, snapshot: SearchSnapshot, country_code: str) -> CountryColumns:
+		# Concurrent searches in a country that isn't loaded yet share the same load
+		if country_code not in snapshot.countries:
+			snapshot.countries[country_code] = asyncio.ensure_future(self._load_country(snapshot, country_code))
+		try:
+			return await asyncio.shield(snapshot.countries[country_code])
+		except Exception:
+			snapshot.countries.pop(country_code, None)
+			raise
+
+	async def _load_country(self, snapshot: SearchSnapshot, country_code: str) -> CountryColumns:
+		# The prices can be newer than the games, that's fine until the next check loads a new snapshot
+		_, prices, delisted = await self.database.get_search_country(country_code)
+		return CountryColumns(snapshot, prices, delisted)
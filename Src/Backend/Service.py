@@ -1,29 +1,67 @@
+import asyncio
 from contextlib import asynccontextmanager
 from typing import Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, date
-from Scraper import Scraper
-from ScrapingThread import ScrapingThread
+from itertools import accumulate
 from Database import Database, Filters, Pagination, Scoring
+from ScrapeStatus import ScrapeStatus
+from Settings import database_path, scrape_interval_hours
+from PriceScheduler import ImpressionCounter
+from SearchEngine import SearchEngine
+from QueryCache import QueryCache, query_key, ranking_key, search_key
+from SearchCursor import SearchCursor, hash_search
+from Metrics import MetricsMiddleware, games_cache, games_phase_seconds, registry, render
+from Log import get_logger, handle_level_signal
+
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
+log = get_logger("Service")
 
 allow_manual_scrape = True # If True, allows manual scraping via API endpoint
-scrape_interval_hours = 12
+status_refresh_seconds = 30 # How often scrape status is read and impressions are written to the database
+max_excluded_games = 2000 # Most hidden games a /games request can exclude, keeps the query string within URL limits
+max_steam_id = 2**32 - 1 # Steam app IDs are unsigned 32 bit, larger excluded IDs are rejected before they reach int64 arrays
+use_search_engine = True # If True and NumPy is installed, /games is answered from an in-memory copy of the games instead of SQL
+games_response_class = ORJSONResponse if orjson else JSONResponse # /games responses are written with orjson when it's installed
+
+database = Database(database_path)
+impressions = ImpressionCounter()
+scrape_status = ScrapeStatus(database, scrape_interval_hours)
+search_engine = SearchEngine(database) if use_search_engine and SearchEngine.is_available() else None
+query_cache = QueryCache()
 
-database = Database()
-scraper = Scraper(database)
-scrapingThread = ScrapingThread(scraper, scrape_interval_hours)
+async def refresh_periodically():
+	while True:
+		await asyncio.sleep(status_refresh_seconds)
+		try:
+			await scrape_status.refresh()
+			await impressions.flush(database)
+		except Exception as e:
+			log.error("Unable to refresh scrape status", error=e)
 
+# Scraping is done by ScraperWorker.py in its own processes, this one only serves the data
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+	handle_level_signal()
 	await database.init_database()
-	scrapingThread.start_continuous_scraping()
+	await scrape_status.refresh()
+	refresh_task = asyncio.create_task(refresh_periodically())
 	yield
+	refresh_task.cancel()
+	await impressions.flush(database)
+	await database.close()
 
 app = FastAPI(lifespan=lifespan)
 
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
 	CORSMiddleware,
 	allow_origins=[
@@ -83,6 +121,53 @@ def validate_country_code(country_code):
 			detail="Invalid country code. Must be a 2-letter ISO code."
 		)
 
+def parse_excluded_games(exclude) -> list[int]:
+	"""Decodes the exclude parameter: sorted steam IDs as base 36 deltas from the previous ID, separated by dots"""
+	if not exclude:
+		return []
+	try:
+		deltas = [int(delta, 36) for delta in exclude.split('.')]
+	except ValueError:
+		raise HTTPException(
+			status_code=400,
+			detail="Invalid exclude format. Expected dot-separated base 36 deltas between sorted steam IDs."
+		)
+	if any(delta < 0 for delta in deltas):
+		raise HTTPException(
+			status_code=400,
+			detail="Invalid exclude format. Steam IDs must be sorted."
+		)
+	if len(deltas) > max_excluded_games:
+		raise HTTPException(
+			status_code=400,
+			detail=f"Can't exclude more than {max_excluded_games} games"
+		)
+	steam_ids = list(accumulate(deltas))
+	# Sorted, so the last is the largest
+	if steam_ids[-1] > max_steam_id:
+		raise HTTPException(
+			status_code=400,
+			detail=f"Invalid exclude format. Steam IDs can't be larger than {max_steam_id}."
+		)
+	return steam_ids
+
+def parse_cursor(cursor, search_hash) -> SearchCursor:
+	if not cursor:
+		return None
+	try:
+		search_cursor = SearchCursor.decode(cursor)
+	except ValueError:
+		raise HTTPException(
+			status_code=400,
+			detail="Invalid cursor"
+		)
+	if search_cursor.search_hash != search_hash:
+		raise HTTPException(
+			status_code=400,
+			detail="Cursor is from a different search, start over without it"
+		)
+	return search_cursor
+
 def ceiling_division(a, b):
 	return -(a // -b)
 
@@ -102,6 +187,8 @@ async def get_games(min_supported_players: Optional[int] = 1,
 				   number_of_reviews_weight: Optional[float] = 0.0,						# How much number of reviews is taken into account
 				   high_price: Optional[float] = 20,									# What an "expensive" game classifies as
 				   next_index: Optional[int] = 0,										# Index of the first game in the response, used for pagination
+				   cursor: Optional[str] = None,										# next_cursor of the previous page, continues after it (replaces next_index)
+				   exclude: Optional[str] = None,										# Hidden steam IDs, see parse_excluded_games
 				   country_code: Optional[str] = "SE"):									
 	
 	from_date = validate_date_string(release_date_from, "release_date_from")
@@ -111,6 +198,7 @@ async def get_games(min_supported_players: Optional[int] = 1,
 	validate_date_ranges(from_date, to_date)
 	validate_pagination(next_index)
 	validate_country_code(country_code)
+	excluded_steam_ids = parse_excluded_games(exclude)
 
 	search_tags = []
 	if tags:
@@ -126,7 +214,8 @@ async def get_games(min_supported_players: Optional[int] = 1,
 		from_date=from_date,
 		to_date=to_date,
 		min_reviews=min_reviews,
-		search_tags=search_tags
+		search_tags=search_tags,
+		excluded_steam_ids=excluded_steam_ids
 	)
     
 	scoring = Scoring(
@@ -137,37 +226,78 @@ async def get_games(min_supported_players: Optional[int] = 1,
 		high_price=high_price
 	)
 
+	search = search_engine or database
+	generation = await search.get_generation()
+
 	max_games_returned = 10
-	pagination = Pagination(limit=max_games_returned, offset=next_index)
+	# Hiding a game between pages keeps the cursor valid, only the count has to be redone
+	search_hash = hash_search(ranking_key(filters, scoring))
+	count_hash = hash_search(search_key(filters, scoring))
+	search_cursor = parse_cursor(cursor, search_hash)
+	if search_cursor:
+		# The count is only reused while the data and excluded games are unchanged
+		count_is_current = search_cursor.generation == generation and search_cursor.count_hash == count_hash
+		pagination = Pagination(limit=max_games_returned, offset=0,
+			after_score=search_cursor.score, after_steam_id=search_cursor.steam_id,
+			total_count=search_cursor.total_count if count_is_current else None)
+	else:
+		pagination = Pagination(limit=max_games_returned, offset=next_index)
 
-	games, total_count = await database.get_games(filters, scoring, pagination)
+	async def search_games():
+		return await search.get_games(filters, scoring, pagination)
+
+	games, total_count = await query_cache.get(query_key(filters, scoring, pagination), generation, search_games)
+	impressions.add([game["steam_id"] for game in games])
+
+	next_cursor = None
+	if len(games) == max_games_returned:
+		last_game = games[-1]
+		next_cursor = SearchCursor(search_hash, count_hash, generation, total_count, last_game["score"], last_game["steam_id"]).encode()
 	
-	status = scrapingThread.get_status()
+	status = scrape_status.get_status()
 	
-	return {
-		"games": [game.to_dict() for game in games],
-		"total_games": total_count,
-		"scraping_in_progress": status["scraping_in_progress"],
-		"last_scrape_hours_ago": status["last_scrape_hours_ago"]
-	}
+	# Returned as a response so FastAPI doesn't walk the games with jsonable_encoder, they're plain JSON types already
+	with games_phase_seconds.time(("serialization",)):
+		return games_response_class({
+			"games": games,
+			"total_games": total_count,
+			"next_cursor": next_cursor,
+			"scraping_in_progress": status["scraping_in_progress"],
+			"last_scrape_hours_ago": status["last_scrape_hours_ago"]
+		})
+
+@app.get("/games/cache")
+async def get_games_cache_stats():
+	return query_cache.get_stats()
+
+@app.get("/metrics")
+async def get_metrics():
+	"""Prometheus metrics of the web server and, labeled by worker, of the scraper workers as of their last heartbeat"""
+	for stat, value in query_cache.get_stats().items():
+		if value is not None:
+			games_cache.set(value, (stat,))
+	sources = [({}, registry.snapshot())]
+	sources.extend(({ "worker": worker_id }, stats["metrics"]) for worker_id, _, _, stats in scrape_status.workers if stats and "metrics" in stats)
+	return PlainTextResponse(render(sources), media_type="text/plain; version=0.0.4")
 
 @app.get("/scrape/status")
 async def get_scrape_status():
-	return scrapingThread.get_status()
+	return {
+		**scrape_status.get_status(),
+		"progress": await scrape_status.get_progress()
+	}
 
 if allow_manual_scrape:
 	@app.post("/scrape/start")
 	async def start_manual_scrape():
-		success, message = scrapingThread.manual_scrape()
-		
-		if not success:
+		if not await scrape_status.start_scrape():
 			raise HTTPException(
 				status_code=409,
-				detail=message
+				detail="Scraping is already in progress"
 			)
 		
 		return {
-			"message": message,
+			"message": "Scraping queued, a scraper worker will start it shortly",
 			"scraping_in_progress": True
 		}
 
@@ -190,6 +320,6 @@ async def serve_frontend():
 @app.get("/{full_path:path}")
 async def serve_spa(full_path: str):
     # Don't catch API routes
-    if full_path.startswith(("games", "countries", "logo", "scrape", "assets")):
+    if full_path.startswith(("games", "countries", "logo", "scrape", "assets", "metrics")):
         raise HTTPException(status_code=404, detail="Not found")
     return FileResponse("../Frontend/dist/index.html")
\ No newline at end of file
@@ -0,0 +1,5 @@
+import os
+
+# Shared by the web server and the scraper workers
+scrape_interval_hours = 12
+database_path = os.environ.get("DATABASE_PATH", "games.db")
@@ -0,0 +1,11 @@
+import os
+import sys
+import pytest
+
+# Modules import each other by name and read Migrations and ../Countries.json relative to Src/Backend
+backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, backend_dir)
+
+@pytest.fixture(autouse=True)
+def in_backend_dir(monkeypatch):
+	monkeypatch.chdir(backend_dir)
@@ -0,0 +1,39 @@
+import asyncio
+import pytest
+from BatchWriter import BatchWriter
+from ScrapeJob import ScrapeJob
+
+class FlakyDatabase:
+	"""Fails that many writes, then records the job items written"""
+	def __init__(self, failures: int):
+		self.failures = failures
+		self.completed_job_items = []
+
+	async def write_batch(self, games, game_sources, countries_data, price_refreshes, completed_job_items):
+		if self.failures:
+			self.failures -= 1
+			raise Exception("database is locked")
+		self.completed_job_items.extend(completed_job_items)
+
+def test_failed_periodic_flush_is_written_later():
+	async def run():
+		database = FlakyDatabase(failures=1)
+		job = ScrapeJob(database, 1, False, "worker")
+		async with BatchWriter(database, flush_interval=0.05) as writer:
+			await writer.complete_job_items(job, "games", ["1", "2", "3"])
+			await asyncio.sleep(0.08)
+			await writer.complete_job_items(job, "games", ["4", "5"])
+		assert [item for _, _, item in database.completed_job_items] == ["1", "2", "3", "4", "5"]
+
+	asyncio.run(run())
+
+def test_unwritable_batch_raises_on_exit():
+	async def run():
+		database = FlakyDatabase(failures=100)
+		job = ScrapeJob(database, 1, False, "worker")
+		with pytest.raises(Exception, match="database is locked"):
+			async with BatchWriter(database, flush_interval=0.05) as writer:
+				await writer.complete_job_items(job, "games", ["1"])
+				await asyncio.sleep(0.08)
+
+	asyncio.run(run())
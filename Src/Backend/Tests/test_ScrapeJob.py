@@ -0,0 +1,117 @@
+import asyncio
+from Database import Database
+from ScrapeJob import ScrapeJob
+from ScraperWorker import ScraperWorker
+
+def make_worker(db_path: str, stages: list[tuple]) -> ScraperWorker:
+	worker = ScraperWorker(Database(db_path))
+	worker.poll_seconds = 0
+	worker.scraper.get_stages = lambda: stages
+	return worker
+
+def test_item_failing_every_attempt_completes_job(tmp_path):
+	ran = []
+
+	async def seed_games(job: ScrapeJob):
+		await job.add_items("games", { str(i): None for i in range(60) })
+
+	async def scrape_games(job: ScrapeJob):
+		while items := await job.claim_items("games", 10):
+			await job.complete_items("games", [item for item, _ in items if item != "13"])
+			if any(item == "13" for item, _ in items):
+				raise Exception("Bad game")
+
+	async def build_search_table(job: ScrapeJob):
+		ran.append("search-table")
+
+	async def run():
+		worker = make_worker(str(tmp_path / "games.db"), [
+			("games", None, seed_games, scrape_games),
+			("search-table", "games", None, build_search_table),
+		])
+		database = worker.database
+		await database.init_database()
+		try:
+			job = await ScrapeJob.start_or_resume(database, True, worker.worker_id)
+			errors = await worker.run_job(job)
+
+			assert errors == [f"1 items in stage games failed {ScrapeJob.max_attempts} times"]
+			assert ran == ["search-table"]
+			assert await database.get_scrape_job("running") is None
+			assert (await database.get_scrape_job("completed"))[0] == job.id
+			assert await database.create_scrape_job(False) is not None
+		finally:
+			await database.close()
+
+	asyncio.run(run())
+
+def test_job_with_failing_stage_is_given_up(tmp_path):
+	async def seed(job: ScrapeJob):
+		raise Exception("Co-Optimus is down")
+
+	async def work(job: ScrapeJob):
+		pass
+
+	async def run():
+		worker = make_worker(str(tmp_path / "games.db"), [("discovery", None, seed, work)])
+		database = worker.database
+		await database.init_database()
+		try:
+			job = await ScrapeJob.start_or_resume(database, True, worker.worker_id)
+			for _ in range(ScrapeJob.max_job_attempts - 1):
+				await worker.run_job(job)
+				assert (await database.get_scrape_job("running"))[0] == job.id
+			await worker.run_job(job)
+
+			assert await database.get_scrape_job("running") is None
+			assert (await database.get_scrape_job("failed"))[0] == job.id
+			assert await database.create_scrape_job(False) is not None
+		finally:
+			await database.close()
+
+	asyncio.run(run())
+
+def test_items_left_unfinished_without_error_are_claimed_again(tmp_path):
+	attempts = []
+
+	async def seed(job: ScrapeJob):
+		await job.add_items("games", { str(i): None for i in range(5) })
+
+	async def work(job: ScrapeJob):
+		# Claims everything but only finishes item 3 on its second attempt, like a write that was lost the first time
+		while items := await job.claim_items("games", 10):
+			attempts.append(len(items))
+			if len(attempts) == 2:
+				await job.complete_items("games", ["3"])
+
+	async def run():
+		worker = make_worker(str(tmp_path / "games.db"), [("games", None, seed, work)])
+		database = worker.database
+		await database.init_database()
+		try:
+			job = await ScrapeJob.start_or_resume(database, True, worker.worker_id)
+			errors = await asyncio.wait_for(worker.run_job(job), 10)
+
+			assert errors == [f"4 items in stage games failed {ScrapeJob.max_attempts} times"]
+			assert attempts == [5, 5, 4]
+		finally:
+			await database.close()
+
+	asyncio.run(run())
+
+def test_failed_attempt_is_counted_once_per_resume(tmp_path):
+	async def run():
+		database = Database(str(tmp_path / "games.db"))
+		await database.init_database()
+		try:
+			jobs = [await ScrapeJob.start_or_resume(database, True, f"worker-{i}") for i in range(ScrapeJob.max_job_attempts)]
+			assert [await job.finish("Co-Optimus is down", resume=True) for job in jobs] == ["running"] * len(jobs)
+			assert (await database.get_scrape_job("running"))[4] == 1
+
+			await jobs[0].finish()
+			assert await jobs[1].finish("Co-Optimus is down", resume=True) == "completed"
+			assert (await database.get_scrape_job("completed"))[4] == 1
+		finally:
+			await database.close()
+
+	asyncio.run(run())
@@ -0,0 +1,46 @@
+import pytest
+from fastapi.testclient import TestClient
+from Benchmarks.GamesLoad import encode_excluded
+from Benchmarks.SyntheticData import generate
+from QueryCache import QueryCache
+from SearchEngine import SearchEngine
+import Service
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+	db_path = str(tmp_path / "games.db")
+	generate(db_path, scale=0.05)
+	monkeypatch.setattr(Service.database, "db_path", db_path)
+	monkeypatch.setattr(Service, "search_engine", SearchEngine(Service.database))
+	monkeypatch.setattr(Service, "query_cache", QueryCache())
+	with TestClient(Service.app) as client:
+		yield client
+
+def get_games(client: TestClient, **params) -> dict:
+	response = client.get("/games", params=params)
+	assert response.status_code == 200, response.text
+	return response.json()
+
+def steam_ids(page: dict) -> list[int]:
+	return [game["steam_id"] for game in page["games"]]
+
+def test_hiding_game_between_pages_keeps_cursor(client):
+	first_page = get_games(client)
+	second_page = get_games(client, cursor=first_page["next_cursor"])
+	# One game already shown and one that would be next
+	hidden = [first_page["games"][3]["steam_id"], second_page["games"][0]["steam_id"]]
+
+	page = get_games(client, cursor=first_page["next_cursor"], exclude=encode_excluded(hidden))
+
+	assert page["total_games"] == first_page["total_games"] - 2
+	assert steam_ids(page)[:9] == steam_ids(second_page)[1:]
+	assert steam_ids(page)[9] not in steam_ids(first_page) + steam_ids(second_page)
+
+@pytest.mark.parametrize("exclude", ["zzzzzzzzzzzzzzzz", "1z141z3.1", "1z141z4"])
+def test_excluding_steam_id_beyond_max_is_rejected(client, exclude):
+	response = client.get("/games", params={ "exclude": exclude })
+	assert response.status_code == 400
+	assert "larger than" in response.json()["detail"]
+
+def test_excluding_largest_steam_id_is_accepted(client):
+	get_games(client, exclude=encode_excluded([Service.max_steam_id]))
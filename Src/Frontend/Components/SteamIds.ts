@@ -0,0 +1,13 @@
+// Most recently hidden games sent to /games, matches max_excluded_games in Service.py
+export const maxExcludedGames = 2000
+
+// Sorted steam IDs as base 36 deltas from the previous ID, separated by dots. Decoded by parse_excluded_games in Service.py
+export const encodeSteamIds = (steamIds: Iterable<string | number>): string => {
+    const sorted = [...new Set([...steamIds].map(Number))].sort((a, b) => a - b)
+    let previous = 0
+    return sorted.map(steamId => {
+        const delta = steamId - previous
+        previous = steamId
+        return delta.toString(36)
+    }).join('.')
+}